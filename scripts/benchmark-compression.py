@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark of compression profiles on sample files."""
+import os
+import sys
+import glob
+import time
+import argparse
+from collections import Counter
+from functools import partial
+from tempfile import TemporaryDirectory
+import netCDF4
+from data_processing import compression, concat_lib
+from data_processing.nc_header_augmenter import copy_file_contents
+
+
+def main(args):
+    args = _parse_args(args)
+    samples = _get_samples(args.data_dir)
+    if not samples:
+        print(f'No sample files in {args.data_dir}')
+        return
+    print(f'{"Sample".ljust(40)}{"Profile".ljust(16)}{"Size (kB)":>12}{"Write (s)":>12}'
+          f'{"Read (s)":>12}')
+    with TemporaryDirectory() as temp_dir:
+        for sample_name, write in samples:
+            for profile_name in args.profiles:
+                profile = compression.get_profile(profile_name)
+                output_file = os.path.join(temp_dir, f'{profile_name}.nc')
+                write_time = _get_mean_time(partial(write, output_file, profile), args.repeat)
+                read_time = _get_mean_time(partial(_read_variables, output_file), args.repeat)
+                size = os.path.getsize(output_file) / 1024
+                print(f'{sample_name.ljust(40)}{profile_name.ljust(16)}{size:12.1f}'
+                      f'{write_time:12.3f}{read_time:12.3f}')
+
+
+def _get_samples(data_dir: str) -> list:
+    """Returns (name, write function) of each sample."""
+    samples = []
+    chm15k_files = sorted(glob.glob(os.path.join(data_dir, 'raw', 'chm15k', '*.nc')))
+    if chm15k_files:
+        date = _get_most_common_date(chm15k_files)
+        samples.append((f'chm15k concatenation {date}',
+                        partial(_concat_chm15k, chm15k_files, date)))
+    for pattern in (('raw', 'model', '*.nc'), ('products', '*.nc')):
+        for file in sorted(glob.glob(os.path.join(data_dir, *pattern))):
+            samples.append((os.path.relpath(file, data_dir), partial(_copy_file, file)))
+    return samples
+
+
+def _concat_chm15k(files: list, date: str, output_file: str,
+                   profile: compression.Profile) -> None:
+    concat_lib.concat_files('chm15k', files, date, output_file, profile=profile)
+
+
+def _copy_file(source_file: str, output_file: str, profile: compression.Profile) -> None:
+    with netCDF4.Dataset(source_file) as source, \
+            netCDF4.Dataset(output_file, 'w', format='NETCDF4_CLASSIC') as target:
+        copy_file_contents(source, target, profile=profile)
+
+
+def _read_variables(full_path: str) -> None:
+    with netCDF4.Dataset(full_path) as nc:
+        for variable in nc.variables.values():
+            variable[:]
+
+
+def _get_mean_time(fun, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fun()
+    return (time.perf_counter() - start) / repeat
+
+
+def _get_most_common_date(files: list) -> str:
+    dates = []
+    for file in files:
+        with netCDF4.Dataset(file) as nc:
+            dates.append(f'{int(nc.year):04d}-{int(nc.month):02d}-{int(nc.day):02d}')
+    return Counter(dates).most_common(1)[0][0]
+
+
+def _parse_args(args):
+    parser = argparse.ArgumentParser(description='Compare file size, write time and read '
+                                                 'time of compression profiles.')
+    parser.add_argument('--data-dir',
+                        dest='data_dir',
+                        type=str,
+                        metavar='/FOO/BAR',
+                        help='Directory of the sample files. Default: tests/data.',
+                        default='tests/data')
+    parser.add_argument('-p', '--profiles',
+                        help='Compared profiles, e.g., default,fast-write. Default: all '
+                             'profiles.',
+                        type=lambda s: s.split(','),
+                        default=list(compression.PROFILES.keys()))
+    parser.add_argument('-n', '--repeat',
+                        type=int,
+                        metavar='N',
+                        help='Number of repetitions of each measurement. Default: 3.',
+                        default=3)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
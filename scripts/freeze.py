@@ -5,41 +5,44 @@ import sys
 import argparse
 import requests
 import glob
+from requests.exceptions import RequestException
 from tempfile import TemporaryDirectory
-from data_processing.utils import read_main_conf
+from data_processing.utils import read_main_conf, ChecksumError
 from data_processing import metadata_api
 from data_processing.pid_utils import PidUtils
 from data_processing.storage_api import StorageApi
-from data_processing import utils
+from data_processing import utils, transport
 
 
-def main(args, storage_session=requests.session()):
+def main(args, storage_session: requests.Session = None):
     args = _parse_args(args)
     config = read_main_conf(args)
-    pid_utils = PidUtils(config)
-    md_api = metadata_api.MetadataApi(config)
-    storage_api = StorageApi(config, storage_session)
+    session = transport.create_session(config)
+    pid_utils = PidUtils(config, session)
+    md_api = metadata_api.MetadataApi(config, session)
+    storage_api = StorageApi(config, storage_session or session)
     metadata = md_api.find_volatile_files_to_freeze()
     print(f'Found {len(metadata)} files to freeze.')
     temp_dir = TemporaryDirectory()
     for row in metadata:
-        full_path = storage_api.download_product(row, temp_dir.name)
         s3key = row['filename']
         try:
+            full_path = storage_api.download_product(row, temp_dir.name)
             uuid, pid = pid_utils.add_pid_to_file(full_path)
             print(f'{uuid} => {pid}')
-            response_data = storage_api.upload_product(full_path, s3key)
+            facts = utils.ProductFacts(full_path)
+            response_data = storage_api.upload_product(full_path, s3key, facts)
             payload = {
                 'uuid': uuid,
-                'checksum': utils.sha256sum(full_path),
+                'checksum': facts.checksum,
                 'volatile': False,
                 'pid': pid,
                 **response_data
             }
             md_api.post('files', payload)
             storage_api.delete_volatile_product(s3key)
-        except OSError as e:
-            print(f'Error: corrupted file in pid-freezing: {full_path}\n{e}', file=sys.stderr)
+        except (OSError, RequestException, ChecksumError) as e:
+            print(f'Error: failed to freeze {s3key}\n{e}', file=sys.stderr)
         for filename in glob.glob(f'{temp_dir.name}/*'):
             os.remove(filename)
 
@@ -7,73 +7,338 @@ import argparse
 from typing import Tuple, Union
 import shutil
 import warnings
-import importlib
-import glob
+import io
+import time
+import copy
+import threading
+from collections import deque
+from functools import partial
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 from tempfile import TemporaryDirectory
 from tempfile import NamedTemporaryFile
 from cloudnetpy.instruments import rpg2nc, ceilo2nc, mira2nc
 from cloudnetpy.categorize import generate_categorize
 from cloudnetpy.utils import date_range
-from data_processing import utils
-from data_processing.metadata_api import MetadataApi
-from data_processing.storage_api import StorageApi
+from cloudnetpy.version import __version__ as cloudnetpy_version
+from data_processing import utils, transport
+from data_processing.metadata_api import MetadataApi, MetadataIndex, MetadataWriter
+from data_processing.catalog import Catalog
+from data_processing.artifacts import ArtifactRegistry
+from data_processing import fingerprints
+from data_processing import daily_files
+from data_processing import compression
+from data_processing.storage_api import StorageApi, PRELOAD
+from data_processing import level2
 from data_processing.pid_utils import PidUtils
+from data_processing import workers
+from data_processing.workers import WorkerPool
+from data_processing.scheduler import Scheduler, FAILED
+from data_processing import incremental
+from data_processing import watcher
 from data_processing import concat_lib
 from data_processing import nc_header_augmenter
 from data_processing.utils import MiscError, RawDataMissingError
-from requests.exceptions import HTTPError, ConnectionError
+from requests.exceptions import HTTPError, ConnectionError, RequestException
 
 warnings.simplefilter("ignore", UserWarning)
 warnings.simplefilter("ignore", RuntimeWarning)
 
-temp_file = NamedTemporaryFile()
-temp_dir = TemporaryDirectory()
 
-
-def main(args, storage_session=requests.session()):
+def main(args, storage_session: requests.Session = None):
     args = _parse_args(args)
+    workers.set_preload(PRELOAD)
     config = utils.read_main_conf(args)
-    start_date = utils.date_string_to_date(args.start)
-    stop_date = utils.date_string_to_date(args.stop)
-    process = Process(args, config, storage_session)
-
-    if 'model' in args.products:
-        models_to_process = process.get_models_to_process(args)
-
-    for date in date_range(start_date, stop_date):
-        date_str = date.strftime("%Y-%m-%d")
-        process.date_str = date_str
-        print(f'{args.site[0]} {date_str}')
-        for product in args.products:
-            print(f'{product.ljust(20)}', end='\t')
-            if product == 'model':
-                print('')
-                for model in models_to_process:
-                    print(f'  {model.ljust(20)}', end='\t')
-                    uuid = Uuid()
-                    try:
-                        uuid.volatile = process.check_product_status(product, model=model)
-                        uuid = process.process_model(uuid, model)
-                        process.upload_product_and_images(temp_file.name, product, uuid,
-                                                          model=model)
-                        process.print_info(uuid)
-                    except (RawDataMissingError, MiscError, HTTPError, ConnectionError) as err:
-                        print(err)
+    session = transport.create_session(config)
+    catalog = Catalog(config, session)
+    if not args.products:
+        args.products = catalog.get_product_types()
+    md_api = MetadataApi(config, session)
+    if args.watch:
+        _watch(args, config, session, storage_session or session, catalog)
+        return
+    if args.incremental:
+        cursor = incremental.Cursor(_get_cursor_dir(config), args.site[0])
+        # Without a cursor, only the dates from --start to --stop are considered
+        window = (args.start, utils.get_date_from_past(1, args.stop))
+        uploads = incremental.fetch_changes(md_api, args.site[0], 'upload-metadata',
+                                            cursor.uploads, *window)
+        files = incremental.fetch_changes(md_api, args.site[0], 'api/files', cursor.files,
+                                          *window)
+        plan = incremental.plan_jobs([row for row in uploads if row['status'] == 'uploaded'],
+                                     files,
+                                     catalog.get_product_types(level=1),
+                                     catalog.get_product_types(level=2))
+        plan = {date_str: [product for product in products if product in args.products]
+                for date_str, products in plan.items()}
+        plan = {date_str: products for date_str, products in plan.items() if products}
+        if not plan:
+            # The changes need no processing, e.g., uploads marked processed by earlier runs
+            cursor.uploads = incremental.get_latest_update(uploads, cursor.uploads)
+            cursor.files = incremental.get_latest_update(files, cursor.files)
+            cursor.save()
+            print('No changes since the previous run')
+            return
+        args.start = min(plan)
+        args.stop = utils.get_date_from_past(-1, max(plan))
+    else:
+        start_date = utils.date_string_to_date(args.start)
+        stop_date = utils.date_string_to_date(args.stop)
+        plan = {date.strftime("%Y-%m-%d"): args.products
+                for date in date_range(start_date, stop_date)}
+    storage_session = storage_session or session
+    process = Process(args, config, storage_session, catalog, session)
+
+    models_to_process = []
+    if any('model' in products for products in plan.values()):
+        models_to_process = process.get_models_to_process()
+
+    is_success = True
+    worker_circuits = []
+    try:
+        if args.jobs > 1:
+            is_success, worker_circuits = _process_in_parallel(process, plan, models_to_process,
+                                                               args.jobs)
+        else:
+            for n_done, (date_str, products) in enumerate(plan.items()):
+                if _is_service_down(session, storage_session):
+                    print(f'Skipped {len(plan) - n_done} remaining dates')
+                    is_success = False
+                    break
+                is_date_success = _process_date(process, date_str, products,
+                                                models_to_process)
+                is_success = is_success and is_date_success
+    finally:
+        process.close()
+    if args.incremental and is_success:
+        # Products changed during the run (mostly by this run) are not processed again
+        changed_files = incremental.fetch_changes(md_api, args.site[0], 'api/files',
+                                                  cursor.files, *window)
+        cursor.files = incremental.get_latest_update(changed_files, cursor.files)
+        cursor.uploads = incremental.get_latest_update(uploads, cursor.uploads)
+        cursor.save()
+    for breaker in _get_open_circuits(session, storage_session):
+        print(f'Error: {breaker.get_summary()}')
+    for summary, _ in worker_circuits:
+        print(f'Error: {summary}')
+    if process.file_cache is not None and args.jobs == 1:
+        print(f'File cache: {process.file_cache.get_summary()}')
+
+
+def _watch(args, config: dict, session: requests.Session,
+           storage_session: requests.Session, catalog: Catalog) -> None:
+    """Process new uploads as they arrive until interrupted."""
+    poll_interval, delay = _get_watch_options(config)
+    md_api = MetadataApi(config, session)
+    debouncer = watcher.Debouncer(delay)
+    site_args = copy.copy(args)
+    site_args.site = args.site[:1]
+    first_process = Process(site_args, config, storage_session, catalog, session)
+    processes = {site: first_process.for_site(site) for site in args.site}
+    print(f'Watching {", ".join(args.site)}')
+    try:
+        while True:
+            try:
+                uploads = [row for site in args.site
+                           for row in watcher.fetch_unprocessed_uploads(md_api, site)]
+            except (HTTPError, ConnectionError) as err:
+                print(f'Error: {err}')
+            else:
+                debouncer.update(uploads)
+            for (site, date_str, _), rows in debouncer.pop_settled():
+                plan = incremental.plan_jobs(rows, [], catalog.get_product_types(level=1),
+                                             catalog.get_product_types(level=2))
+                products = [product for product in plan.get(date_str, [])
+                            if product in args.products]
+                if not products:
+                    continue
+                process = processes[site]
+                process.set_date_range(date_str, date_str)
+                models_to_process = []
+                if 'model' in products:
+                    models_to_process = process.get_models_to_process()
+                if not _process_date(process, date_str, products, models_to_process):
+                    debouncer.forget(rows)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print('Stopped watching')
+    finally:
+        first_process.close()
+
+
+def _get_watch_options(config: dict) -> Tuple[float, float]:
+    watch_config = config['WATCH'] if 'WATCH' in config else {}
+    return (float(watch_config.get('poll_interval', 60)),
+            float(watch_config.get('debounce', 900)))
+
+
+def _get_open_circuits(*sessions) -> list:
+    unique_sessions = {id(session): session for session in sessions}.values()
+    return [breaker for session in unique_sessions
+            for breaker in transport.get_open_circuits(session)]
+
+
+def _is_service_down(*sessions) -> bool:
+    """Return True if a service has failed repeatedly and will not be probed again."""
+    return any(not breaker.can_recover for breaker in _get_open_circuits(*sessions))
+
+
+def _get_cursor_dir(config: dict) -> str:
+    if 'INCREMENTAL' in config:
+        return config['INCREMENTAL'].get('cursor_dir', './cache/cursors')
+    return './cache/cursors'
+
+
+def _process_date(process, date_str: str, products: list, models_to_process: list) -> bool:
+    print(f'{process.site} {date_str}')
+    l1_products = process.catalog.get_product_types(level=1)
+    l2_products = process.catalog.get_product_types(level=2)
+    scheduler = Scheduler()
+    for product in products:
+        if product == 'model':
+            task = partial(_process_models, process, models_to_process)
+        else:
+            task = partial(_process_product, process, product, l2_products)
+        scheduler.add(product, task, _get_dependencies(product, l1_products, l2_products))
+    with process.workspace(date_str):
+        status = scheduler.run(on_skip=_get_skip_message)
+    process.artifacts.release(date_str)
+    return FAILED not in status.values()
+
+
+def _process_models(process, models_to_process: list) -> bool:
+    print(f'{"model".ljust(20)}')
+    is_success = True
+    for model in models_to_process:
+        print(f'  {model.ljust(20)}', end='\t')
+        uuid = Uuid()
+        try:
+            with process.product_workspace():
+                uuid.volatile = process.check_product_status('model', model=model)
+                uuid = process.process_model(uuid, model)
+                process.upload_product_and_images(process.temp_file, 'model', uuid, model=model)
+                process.print_info(uuid)
+        except (RawDataMissingError, MiscError) as err:
+            print(err)
+        except (HTTPError, ConnectionError, RuntimeError) as err:
+            print(err)
+            is_success = False
+    return is_success
+
+
+def _process_product(process, product: str, l2_products: list) -> None:
+    print(f'{product.ljust(20)}', end='\t')
+    uuid = Uuid()
+    try:
+        with process.product_workspace():
+            uuid.volatile = process.check_product_status(product)
+            if product in l2_products:
+                uuid, identifier = process.process_level2(uuid, product)
+            elif product in CONVERTERS:
+                uuid, identifier = process.process_raw_data(uuid, product)
             else:
-                uuid = Uuid()
-                try:
-                    uuid.volatile = process.check_product_status(product)
-                    if product in utils.get_product_types(level=2):
-                        uuid, identifier = process.process_level2(uuid, product)
-                    else:
-                        uuid, identifier = getattr(process, f'process_{product}')(uuid)
-                    process.upload_product_and_images(temp_file.name, product, uuid,
-                                                      product_type=identifier)
-                    process.print_info(uuid)
-                except (RawDataMissingError, MiscError, HTTPError, ConnectionError,
-                        RuntimeError) as err:
-                    print(err)
-        _clean_temp_dir()
+                uuid, identifier = getattr(process, f'process_{product}')(uuid)
+            process.upload_product_and_images(process.temp_file, product, uuid,
+                                              product_type=identifier)
+            process.print_info(uuid)
+    except (RawDataMissingError, MiscError) as err:
+        print(err)
+
+
+def _get_dependencies(product: str, l1_products: list, l2_products: list) -> list:
+    """Return products that need to be processed before the given product."""
+    if product == 'categorize':
+        return l1_products
+    if product in l2_products:
+        return ['categorize']
+    return []
+
+
+def _get_skip_message(product: str, failed_product: str) -> str:
+    return f'{product.ljust(20)}\tSkipped: {failed_product} failed'
+
+
+def _process_in_parallel(process, plan: dict, models_to_process: list,
+                         jobs: int) -> Tuple[bool, list]:
+    """Process dates in worker processes, `jobs` dates at a time, printing in date order.
+
+    Metadata of all dates is fetched once here and each worker gets the metadata of its
+    own date. No more dates are started once this process or a worker has found a
+    service down.
+
+    Returns:
+        tuple: True if all dates succeeded, and (summary, can_recover) of the circuit
+            breakers left open in the workers.
+
+    """
+    try:
+        process.prefetch()
+    except RequestException as err:
+        # Workers fetch the metadata of their own date instead
+        print(f'Prefetching metadata failed: {err}')
+    is_success = True
+    circuits = []
+    pending = list(plan.items())
+    running = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            while pending and len(running) < jobs and not _is_down(process, circuits):
+                date_str, products = pending.pop(0)
+                running.append(executor.submit(_process_date_captured,
+                                               process.for_date(date_str), date_str,
+                                               products, models_to_process))
+            if not running:
+                break
+            output, is_date_success, date_circuits = running.popleft().result()
+            print(output, end='')
+            is_success = is_success and is_date_success
+            circuits += date_circuits
+    if pending:
+        print(f'Skipped {len(pending)} remaining dates')
+        is_success = False
+    return is_success, circuits
+
+
+def _is_down(process, worker_circuits: list) -> bool:
+    return (any(not breaker.can_recover for breaker in process.get_open_circuits())
+            or any(not can_recover for _, can_recover in worker_circuits))
+
+
+def _process_date_captured(process, date_str: str, products: list,
+                           models_to_process: list) -> Tuple[str, bool, list]:
+    """Process one date in a worker and return its output as a single block, its success
+    and (summary, can_recover) of the circuit breakers left open.
+
+    The worker and plotting processes of the date are stopped when the date is done.
+    """
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            is_success = _process_date(process, date_str, products, models_to_process)
+        circuits = [(breaker.get_summary(), breaker.can_recover)
+                    for breaker in process.get_open_circuits()]
+    finally:
+        process.close()
+    return output.getvalue(), is_success, circuits
+
+
+CONVERTERS = {}
+
+
+def converter(product: str, instrument: str):
+    """Register a raw data converter of an instrument producing a Level 1 product.
+
+    Instruments of a product are selected in registration order: the first instrument
+    with raw data for the date is converted. Registering an instrument twice for the same
+    product raises ValueError.
+    """
+    def register(function):
+        converters = CONVERTERS.setdefault(product, {})
+        if instrument in converters:
+            raise ValueError(f'Converter of {instrument} to {product} already registered')
+        converters[instrument] = function
+        return function
+    return register
 
 
 class Uuid:
@@ -90,15 +355,93 @@ class Process:
     def __init__(self,
                  args,
                  config: dict,
-                 storage_session):
-        self.site_meta = utils.read_site_info(args.site[0])
+                 storage_session: requests.Session,
+                 catalog: Catalog,
+                 session: requests.Session):
+        self.catalog = catalog
+        self.site_meta = catalog.get_site_info(args.site[0])
         self.is_reprocess = args.reprocess
         self.plot_images = self.check_if_plot_images(args)
         self.date_str = None
-        self._md_api = MetadataApi(config)
-        self._storage_api = StorageApi(config, storage_session)
-        self._pid_utils = PidUtils(config)
+        self._scratch = threading.local()
+        self.artifacts = ArtifactRegistry()
+        self._fingerprints = _create_fingerprint_store(config)
+        self._daily_files = daily_files.create_daily_file_cache(config)
+        self._profile = compression.get_configured_profile(config)
+        self._md_api = MetadataApi(config, session)
+        self._md_index = MetadataIndex(self._md_api, self.site_meta['id'], args.start,
+                                       utils.get_date_from_past(1, args.stop))
+        n_workers = _get_worker_count(args.jobs)
+        self._storage_api = StorageApi(config, storage_session, plot_workers=n_workers)
+        self._pid_utils = PidUtils(config, session)
         self._site = self.site_meta['id']
+        self._workers = WorkerPool(max_workers=n_workers)
+        self._input_lock = threading.Lock()
+
+    @property
+    def site(self) -> str:
+        return self._site
+
+    @property
+    def file_cache(self):
+        return self._storage_api.file_cache
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_scratch'], state['_input_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._scratch = threading.local()
+        self._input_lock = threading.Lock()
+
+    @property
+    def temp_file(self) -> str:
+        return self._scratch.temp_file
+
+    @property
+    def temp_dir(self) -> str:
+        return self._scratch.temp_dir
+
+    @contextmanager
+    def workspace(self, date_str: str):
+        """Set the processed date."""
+        self.date_str = date_str
+        try:
+            yield
+        finally:
+            self.date_str = None
+
+    @contextmanager
+    def product_workspace(self):
+        """Provide private scratch directory and output file for the calling thread."""
+        with TemporaryDirectory() as temp_dir, NamedTemporaryFile() as temp_file:
+            self._scratch.temp_dir = temp_dir
+            self._scratch.temp_file = temp_file.name
+            self._scratch.fingerprint = None
+            try:
+                yield
+            finally:
+                del self._scratch.temp_dir, self._scratch.temp_file, self._scratch.fingerprint
+
+    def prefetch(self) -> None:
+        """Fetch file and upload metadata of all processed dates."""
+        self._md_index.prefetch()
+
+    def for_date(self, date_str: str) -> 'Process':
+        """Return copy of the process holding only the metadata of the given date."""
+        process = copy.copy(self)
+        process._md_index = self._md_index.for_date(date_str)
+        return process
+
+    def get_open_circuits(self) -> list:
+        return _get_open_circuits(self._md_api.session, self._storage_api.session)
+
+    def close(self) -> None:
+        """Stops the worker and plotting processes."""
+        self._workers.close()
+        self._storage_api.close()
 
     def check_if_plot_images(self, args) -> bool:
         plot_images = not args.no_img
@@ -107,93 +450,138 @@ class Process:
         return plot_images
 
     def process_model(self, uuid: Uuid, model: str) -> Uuid:
-        uuid.raw, upload_filename = self._get_daily_raw_file(temp_file.name, model=model)
-        uuid.product = nc_header_augmenter.fix_model_file(temp_file.name, self._site, uuid.volatile)
+        upload_metadata = self._md_index.get_uploads(self.date_str, model=model)
+        self._check_raw_data_status(upload_metadata)
+        uuid.raw, upload_filename = self._get_daily_raw_file(self.temp_file, upload_metadata)
+        uuid.product = self._workers.run(nc_header_augmenter.fix_model_file, self.temp_file,
+                                         self._site, uuid.volatile, self._profile)
         return uuid
 
-    def process_mwr(self, uuid: Uuid) -> Tuple[Uuid, str]:
-        instrument = 'hatpro'
-        uuid.raw, upload_filename = self._get_daily_raw_file(temp_file.name, instrument=instrument)
-        uuid.product = nc_header_augmenter.fix_mwr_file(temp_file.name, upload_filename,
-                                                        self.date_str, self._site, uuid.volatile)
-        return uuid, instrument
+    def process_raw_data(self, uuid: Uuid, product: str) -> Tuple[Uuid, str]:
+        """Converts raw data of the first registered instrument with data for the date."""
+        instrument, upload_metadata = self._select_instrument(product)
+        convert = CONVERTERS[product][instrument]
+        return convert(self, uuid, upload_metadata), instrument
+
+    @converter('mwr', 'hatpro')
+    def _convert_hatpro(self, uuid: Uuid, upload_metadata: list) -> Uuid:
+        uuid.raw, upload_filename = self._get_daily_raw_file(self.temp_file, upload_metadata)
+        uuid.product = self._workers.run(nc_header_augmenter.fix_mwr_file, self.temp_file,
+                                         upload_filename, self.date_str, self._site,
+                                         uuid.volatile)
+        return uuid
 
-    def process_radar(self, uuid: Uuid) -> Tuple[Uuid, str]:
-        try:
-            instrument = 'rpg-fmcw-94'
-            full_paths, uuids = self._download_raw_data(instrument=instrument)
-            uuid.product, valid_full_paths = rpg2nc(temp_dir.name, temp_file.name,
-                                                    self.site_meta, uuid=uuid.volatile,
-                                                    date=self.date_str)
-            uuid.raw = _get_valid_uuids(uuids, full_paths, valid_full_paths)
+    @converter('radar', 'rpg-fmcw-94')
+    def _convert_rpg_fmcw_94(self, uuid: Uuid, upload_metadata: list) -> Uuid:
+        full_paths, uuids = self._download_raw_data(upload_metadata)
+        uuid.product, valid_full_paths = self._workers.run(rpg2nc, self.temp_dir,
+                                                           self.temp_file, self.site_meta,
+                                                           uuid=uuid.volatile,
+                                                           date=self.date_str)
+        uuid.raw = _get_valid_uuids(uuids, full_paths, valid_full_paths)
+        return uuid
 
-        except RawDataMissingError:
-            instrument = 'mira'
-            raw_daily_file = NamedTemporaryFile()
-            uuid.raw, _ = self._get_daily_raw_file(raw_daily_file.name, instrument=instrument)
-            uuid.product = mira2nc(raw_daily_file.name, temp_file.name, self.site_meta,
-                                   uuid=uuid.volatile)
-        return uuid, instrument
-
-    def process_lidar(self, uuid: Uuid) -> Tuple[Uuid, str]:
-
-        def _concatenate_chm15k() -> list:
-            full_paths, uuids = self._download_raw_data(instrument=instrument)
-            valid_full_paths = concat_lib.concat_chm15k_files(full_paths, self.date_str,
-                                                              raw_daily_file.name)
-            return _get_valid_uuids(uuids, full_paths, valid_full_paths)
-        try:
-            instrument = 'chm15k'
-            raw_daily_file = NamedTemporaryFile(suffix='.nc')
-            uuid.raw = _concatenate_chm15k()
-        except RawDataMissingError:
-            instrument = 'cl51'
-            raw_daily_file = NamedTemporaryFile(suffix='.DAT')
-            uuid.raw, _ = self._get_daily_raw_file(raw_daily_file.name, instrument=instrument)
-
-        uuid.product = ceilo2nc(raw_daily_file.name, temp_file.name, self.site_meta,
-                                uuid=uuid.volatile)
-        return uuid, instrument
+    @converter('radar', 'mira')
+    def _convert_mira(self, uuid: Uuid, upload_metadata: list) -> Uuid:
+        raw_daily_file = NamedTemporaryFile(dir=self.temp_dir)
+        uuid.raw, _ = self._get_daily_raw_file(raw_daily_file.name, upload_metadata)
+        uuid.product = self._workers.run(mira2nc, raw_daily_file.name, self.temp_file,
+                                         self.site_meta, uuid=uuid.volatile)
+        return uuid
+
+    @converter('lidar', 'chm15k')
+    def _convert_chm15k(self, uuid: Uuid, upload_metadata: list) -> Uuid:
+        return self._convert_ceilometer(uuid, 'chm15k', upload_metadata)
+
+    @converter('lidar', 'cl51')
+    def _convert_cl51(self, uuid: Uuid, upload_metadata: list) -> Uuid:
+        return self._convert_ceilometer(uuid, 'cl51', upload_metadata)
+
+    def _convert_ceilometer(self, uuid: Uuid, instrument: str, upload_metadata: list) -> Uuid:
+        suffix = concat_lib.CONCATENATORS[instrument].suffix
+        raw_daily_file = NamedTemporaryFile(suffix=suffix, dir=self.temp_dir)
+        if self._daily_files is None:
+            full_paths, uuids = self._download_raw_data(upload_metadata)
+            valid_full_paths = self._workers.run(concat_lib.concat_files, instrument,
+                                                 full_paths, self.date_str,
+                                                 raw_daily_file.name, profile=self._profile)
+            uuid.raw = _get_valid_uuids(uuids, full_paths, valid_full_paths)
+            daily_file = raw_daily_file.name
+        else:
+            daily_file, uuid.raw = self._update_daily_file(instrument, upload_metadata)
+        uuid.product = self._workers.run(ceilo2nc, daily_file, self.temp_file, self.site_meta,
+                                         uuid=uuid.volatile)
+        return uuid
 
     def process_categorize(self, uuid: Uuid) -> Tuple[Uuid, str]:
-        l1_products = utils.get_product_types(level=1)
+        l1_products = self.catalog.get_product_types(level=1)
         input_files = {key: '' for key in l1_products}
-        for product in l1_products:
-            payload = self._get_payload()
-            all_metadata = self._md_api.get('api/files', payload)
-            metadata = self._md_api.screen_metadata(all_metadata, product=product)
-            if metadata:
-                input_files[product] = self._storage_api.download_product(metadata[0],
-                                                                          temp_dir.name)
+        input_files.update(self._get_input_files(l1_products, 'categorize', uuid))
         if not input_files['mwr'] and 'rpg-fmcw-94' in input_files['radar']:
             input_files['mwr'] = input_files['radar']
         missing = [product for product in l1_products if not input_files[product]]
         if missing:
             raise MiscError(f'Missing required input files: {", ".join(missing)}')
-        uuid.product = generate_categorize(input_files, temp_file.name, uuid=uuid.volatile)
+        uuid.product = self._workers.run(generate_categorize, input_files, self.temp_file,
+                                         uuid=uuid.volatile)
         return uuid, 'categorize'
 
     def process_level2(self, uuid: Uuid, product: str) -> Tuple[Uuid, str]:
-        payload = self._get_payload()
-        all_metadata = self._md_api.get('api/files', payload)
-        metadata = self._md_api.screen_metadata(all_metadata, product='categorize')
-        assert len(metadata) <= 1
-        if metadata:
-            categorize_file = self._storage_api.download_product(metadata[0], temp_dir.name)
+        assert len(self._md_index.get_files(self.date_str, 'categorize')) <= 1
+        input_files = self._get_input_files(['categorize'], product, uuid)
+        if 'categorize' in input_files:
+            categorize_file = input_files['categorize']
         else:
             raise MiscError(f'Missing input categorize file')
-        module = importlib.import_module(f'cloudnetpy.products.{product}')
-        fun = getattr(module, f'generate_{product}')
-        uuid.product = fun(categorize_file, temp_file.name, uuid=uuid.volatile)
+        uuid.product = self._workers.run(level2.generate_product, product, categorize_file,
+                                         self.temp_file, uuid=uuid.volatile)
         identifier = utils.get_product_identifier(product)
         return uuid, identifier
 
+    def _get_input_files(self, products: list, output_product: str, uuid: Uuid) -> dict:
+        """Return paths of the current input files, downloading only those not created or
+        downloaded earlier in this run.
+
+        Downloaded files are kept for the rest of the date, so that e.g. all Level 2
+        products use the same local categorize file.
+        """
+        input_metadata = {}
+        for product in products:
+            files = self._md_index.get_files(self.date_str, product)
+            if files:
+                input_metadata[product] = files[0]
+        self._check_input_fingerprint(output_product, uuid, list(input_metadata.values()))
+        input_files = {}
+        metadata = {}
+        with self._input_lock:
+            for product, row in input_metadata.items():
+                artifact = self.artifacts.get(self.date_str, product, row['uuid'])
+                if artifact:
+                    input_files[product] = artifact
+                else:
+                    metadata[product] = row
+            full_paths = self._storage_api.download_products(list(metadata.values()),
+                                                             self.temp_dir)
+            for (product, row), full_path in zip(metadata.items(), full_paths):
+                input_files[product] = self.artifacts.add(self.date_str, product, full_path,
+                                                          row['uuid'], row['filename'])
+        return input_files
+
+    def _check_input_fingerprint(self, product: str, uuid: Uuid, input_metadata: list) -> None:
+        """Raise MiscError if the volatile product was created from the same inputs."""
+        if self._fingerprints is None:
+            return
+        fingerprint = fingerprints.get_fingerprint(input_metadata, cloudnetpy_version)
+        self._scratch.fingerprint = (product, fingerprint)
+        if self.is_reprocess or not uuid.volatile:
+            return
+        stored = self._fingerprints.get(self._site, self.date_str, product)
+        if stored == {'fingerprint': fingerprint, 'uuid': uuid.volatile}:
+            raise MiscError('Input files not changed')
+
     def check_product_status(self, product: str, model: str = None) -> Union[str, None, bool]:
-        payload = self._get_payload({'showLegacy': True})
-        if model:
-            payload['model'] = model
-        all_metadata = self._md_api.get('api/files', payload)
-        metadata = self._md_api.screen_metadata(all_metadata, product=product)
+        metadata = self._md_index.get_files(self.date_str, product, model=model,
+                                            show_legacy=True)
         if metadata:
             if not metadata[0]['volatile'] and not self.is_reprocess:
                 raise MiscError('Existing freezed file and no "reprocess" flag')
@@ -212,8 +600,9 @@ class Process:
         if self._is_new_version(uuid):
             self._pid_utils.add_pid_to_file(full_path)
 
+        facts = utils.ProductFacts(full_path)
         s3key = self._get_product_key(identifier)
-        file_info = self._storage_api.upload_product(full_path, s3key)
+        file_info = self._storage_api.upload_product(full_path, s3key, facts)
 
         if self.plot_images:
             img_metadata = self._storage_api.create_and_upload_images(full_path, s3key,
@@ -222,22 +611,42 @@ class Process:
             img_metadata = []
 
         payload = utils.create_product_put_payload(full_path, file_info, model=model,
-                                                   site=self._site)
-        self._md_api.put(s3key, payload)
+                                                   site=self._site, facts=facts)
+        writer = MetadataWriter(self._md_api)
+        writer.put(s3key, payload)
         for data in img_metadata:
-            self._md_api.put_img(data, uuid.product)
-        if product in utils.get_product_types(level=1):
-            self._update_statuses(uuid.raw)
-
-    def get_models_to_process(self, args) -> list:
-        payload = {
-            'site': self._site,
-            'dateFrom': args.start,
-            'dateTo': args.stop,
-        }
+            writer.put_img(data, uuid.product)
+        is_l1_product = product in self.catalog.get_product_types(level=1)
+        if is_l1_product:
+            writer.update_statuses(uuid.raw, 'processed')
+        try:
+            writer.flush()
+        finally:
+            self._md_index.invalidate_files(self.date_str)
+        if is_l1_product:
+            self._md_index.set_upload_status(uuid.raw, 'processed')
+        self.artifacts.add(self.date_str, product, full_path, facts.uuid, s3key)
+        if self._scratch.fingerprint:
+            self._fingerprints.set(self._site, self.date_str, *self._scratch.fingerprint,
+                                   uuid=facts.uuid)
+
+    def for_site(self, site: str) -> 'Process':
+        """Return process of another site sharing the worker and plotting processes."""
+        process = copy.copy(self)
+        process.site_meta = self.catalog.get_site_info(site)
+        process._site = process.site_meta['id']
+        process.artifacts = ArtifactRegistry()
+        process._md_index = self._md_index.for_site(process._site)
+        return process
+
+    def set_date_range(self, start: str, stop: str) -> None:
+        """Sets dates (both included) of the indexed metadata, dropping the cached metadata."""
+        self._md_index = MetadataIndex(self._md_api, self._site, start, stop)
+
+    def get_models_to_process(self) -> list:
+        metadata = self._md_index.get_all_uploads()
         if not self.is_reprocess:
-            payload['status'] = 'uploaded'
-        metadata = self._md_api.get('upload-metadata', payload)
+            metadata = [row for row in metadata if row['status'] == 'uploaded']
         model_metadata = [row for row in metadata if row['model'] is not None]
         model_ids = [row['model']['id'] for row in model_metadata]
         return list(set(model_ids))
@@ -245,32 +654,59 @@ class Process:
     def print_info(self, uuid: Uuid) -> None:
         print(f'Created: {"New version" if self._is_new_version(uuid) else "Volatile file"}')
 
-    def _get_daily_raw_file(self,
-                            raw_daily_file: str,
-                            instrument: str = None,
-                            model: str = None) -> Tuple[list, str]:
-        full_path, uuid = self._download_raw_data(instrument=instrument, model=model,
-                                                  largest_file_only=True)
+    def _select_instrument(self, product: str) -> Tuple[str, list]:
+        """Return first registered instrument of a product with raw data, and its uploads."""
+        for instrument in CONVERTERS[product]:
+            upload_metadata = self._md_index.get_uploads(self.date_str, instrument=instrument)
+            if upload_metadata:
+                self._check_raw_data_status(upload_metadata)
+                return instrument, upload_metadata
+        raise RawDataMissingError('No raw data')
+
+    def _update_daily_file(self, instrument: str, upload_metadata: list) -> Tuple[str, list]:
+        """Append new raw files to the cached daily file, or rebuild it if needed.
+
+        Returns path of the daily file and uuids of the valid raw files it contains.
+        """
+        key = (self._site, self.date_str,
+               f'{instrument}{concat_lib.CONCATENATORS[instrument].suffix}')
+        daily_file = self._daily_files.get_path(*key)
+        manifest, new_uploads = self._daily_files.get_new_uploads(*key, upload_metadata)
+        self._daily_files.invalidate(*key)
+        full_paths, valid_full_paths = [], []
+        if manifest and new_uploads:
+            full_paths, _ = self._download_raw_data(new_uploads)
+            try:
+                valid_full_paths = self._workers.run(concat_lib.append_files, instrument,
+                                                     full_paths, self.date_str, daily_file,
+                                                     self._profile)
+            except ValueError:
+                manifest, new_uploads = [], sorted(upload_metadata,
+                                                   key=lambda row: row['filename'])
+        if not manifest:
+            full_paths, _ = self._download_raw_data(new_uploads)
+            valid_full_paths = self._workers.run(concat_lib.concat_files, instrument,
+                                                 full_paths, self.date_str, daily_file,
+                                                 unlimited_time=True, profile=self._profile)
+        manifest += daily_files.get_manifest_entries(new_uploads, full_paths, valid_full_paths)
+        self._daily_files.save_manifest(*key, manifest)
+        return daily_file, [entry['uuid'] for entry in manifest if entry['valid']]
+
+    def _get_daily_raw_file(self, raw_daily_file: str,
+                            upload_metadata: list) -> Tuple[list, str]:
+        full_path, uuid = self._download_raw_data(upload_metadata, largest_file_only=True)
         shutil.move(full_path[0], raw_daily_file)
         original_filename = os.path.basename(full_path[0])
         return uuid, original_filename
 
-    def _download_raw_data(self,
-                           instrument: str = None,
-                           model: str = None,
+    def _download_raw_data(self, upload_metadata: list,
                            largest_file_only: bool = False) -> Tuple[list, list]:
-        payload = self._get_payload()
-        all_upload_metadata = self._md_api.get('upload-metadata', payload)
-        upload_metadata = self._md_api.screen_metadata(all_upload_metadata,
-                                                       instrument=instrument,
-                                                       model=model)
-        self._check_raw_data_status(upload_metadata)
         if largest_file_only:
             if len(upload_metadata) > 1:
                 print('Warning: several daily raw files (probably submitted without '
                       '"allowUpdate")', end='\t')
             upload_metadata = [upload_metadata[0]]
-        full_paths = self._storage_api.download_raw_files(upload_metadata, temp_dir.name)
+        full_paths = self._storage_api.download_raw_files(upload_metadata, self.temp_dir)
         uuids = [row['uuid'] for row in upload_metadata]
         return full_paths, uuids
 
@@ -281,23 +717,6 @@ class Process:
         if not is_unprocessed_data and not self.is_reprocess:
             raise MiscError('Raw data already processed')
 
-    def _update_statuses(self, uuids: list) -> None:
-        for uuid in uuids:
-            payload = {'uuid': uuid, 'status': 'processed'}
-            self._md_api.post('upload-metadata', payload)
-
-    def _get_payload(self, args: dict = None) -> dict:
-        payload = {
-            'dateFrom': self.date_str,
-            'dateTo': self.date_str,
-            'site': self._site,
-            'developer': True
-        }
-        if args:
-            for key, value in args.items():
-                payload[key] = value
-        return payload
-
     def _get_product_key(self, identifier: str) -> str:
         return f"{self.date_str.replace('-', '')}_{self._site}_{identifier}.nc"
 
@@ -305,13 +724,20 @@ class Process:
         return self.is_reprocess and uuid.volatile is False
 
 
-def _get_valid_uuids(uuids: list, full_paths: list, valid_full_paths: list) -> list:
-    return [uuid for uuid, full_path in zip(uuids, full_paths) if full_path in valid_full_paths]
+def _create_fingerprint_store(config: dict) -> Union[fingerprints.FingerprintStore, None]:
+    if 'FINGERPRINTS' not in config:
+        return None
+    return fingerprints.FingerprintStore(config['FINGERPRINTS'].get('store_dir',
+                                                                    './cache/fingerprints'))
 
 
-def _clean_temp_dir():
-    for filename in glob.glob(f'{temp_dir.name}/*'):
-        os.remove(filename)
+def _get_worker_count(jobs: int) -> int:
+    """Return number of worker processes per date processed in parallel."""
+    return max((os.cpu_count() or 1) // jobs, 1)
+
+
+def _get_valid_uuids(uuids: list, full_paths: list, valid_full_paths: list) -> list:
+    return [uuid for uuid, full_path in zip(uuids, full_paths) if full_path in valid_full_paths]
 
 
 def _parse_args(args):
@@ -342,14 +768,31 @@ def _parse_args(args):
                         default=False)
     parser.add_argument('-p', '--products',
                         help='Products to be processed, e.g., radar,lidar,model,categorize,'
-                             'classification',
+                             'classification. Default: all products.',
                         type=lambda s: s.split(','),
-                        default=utils.get_product_types())
+                        default=None)
     parser.add_argument('--no-img',
                         dest='no_img',
                         action='store_true',
                         help='Skip image creation.',
                         default=False)
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        metavar='N',
+                        help='Number of dates processed in parallel. Default: 1.',
+                        default=1)
+    parser.add_argument('--incremental',
+                        action='store_true',
+                        help='Process only dates and products affected by uploads and products '
+                             'changed since the previous incremental run. The first run '
+                             'considers only dates from --start to --stop.',
+                        default=False)
+    parser.add_argument('--watch',
+                        action='store_true',
+                        help='Keep running and process new uploads once no more files have '
+                             'arrived for the same site, date and instrument for a while. '
+                             'Ignores --start and --stop.',
+                        default=False)
     return parser.parse_args(args)
 
 
@@ -8,9 +8,9 @@ from tempfile import NamedTemporaryFile
 import netCDF4
 from requests import HTTPError
 from data_processing.metadata_api import MetadataApi
-from data_processing.storage_api import StorageApi
+from data_processing.storage_api import StorageApi, PRELOAD
 from data_processing.pid_utils import PidUtils
-from data_processing import utils
+from data_processing import utils, transport, compression, workers
 from data_processing.nc_header_augmenter import fix_legacy_file
 from data_processing.utils import MiscError
 
@@ -18,10 +18,13 @@ from data_processing.utils import MiscError
 def main():
     """The main function."""
 
+    workers.set_preload(PRELOAD)
     config = utils.read_main_conf(ARGS)
-    md_api = MetadataApi(config)
-    storage_api = StorageApi(config)
-    pid_utils = PidUtils(config)
+    session = transport.create_session(config)
+    md_api = MetadataApi(config, session)
+    storage_api = StorageApi(config, session)
+    pid_utils = PidUtils(config, session)
+    profile = compression.get_configured_profile(config)
 
     site = PurePath(ARGS.path[0]).name
 
@@ -35,47 +38,52 @@ def main():
     if ARGS.year is not None:
         dir_names = [f'{dir_name}{ARGS.year}' for dir_name in dir_names]
 
-    for dir_name in dir_names:
-        files = _get_files(ARGS.path[0], dir_name)
-
-        for file in files:
-            legacy_file = LegacyFile(file)
-
-            try:
-                info = {
-                    'date_str': legacy_file.get_date_str(),
-                    'product': legacy_file.get_product_type(),
-                    'identifier': legacy_file.get_identifier(),
-                    'site': site
-                }
-                _check_if_exists(md_api, info)
-            except (MiscError, HTTPError, ValueError) as err:
-                print(err)
-                continue
-            finally:
-                legacy_file.close()
-
-            s3key = _get_s3key(info)
-            print(s3key)
-
-            temp_file = NamedTemporaryFile()
-            uuid = fix_legacy_file(file, temp_file.name)
-
-            pid_utils.add_pid_to_file(temp_file.name)
-            upload_info = storage_api.upload_product(temp_file.name, s3key)
-            img_metadata = storage_api.create_and_upload_images(temp_file.name, s3key, uuid,
-                                                                info['product'], legacy=True)
-            payload = utils.create_product_put_payload(temp_file.name,
-                                                       upload_info,
-                                                       product=info['product'],
-                                                       date_str=info['date_str'],
-                                                       site=site)
-            payload['legacy'] = True
-            md_api.put(s3key, payload)
-            for data in img_metadata:
-                md_api.put_img(data, uuid)
-
-            temp_file.close()
+    try:
+        for dir_name in dir_names:
+            files = _get_files(ARGS.path[0], dir_name)
+
+            for file in files:
+                legacy_file = LegacyFile(file)
+
+                try:
+                    info = {
+                        'date_str': legacy_file.get_date_str(),
+                        'product': legacy_file.get_product_type(),
+                        'identifier': legacy_file.get_identifier(),
+                        'site': site
+                    }
+                    _check_if_exists(md_api, info)
+                except (MiscError, HTTPError, ValueError) as err:
+                    print(err)
+                    continue
+                finally:
+                    legacy_file.close()
+
+                s3key = _get_s3key(info)
+                print(s3key)
+
+                temp_file = NamedTemporaryFile()
+                uuid = fix_legacy_file(file, temp_file.name, profile)
+
+                pid_utils.add_pid_to_file(temp_file.name)
+                facts = utils.ProductFacts(temp_file.name)
+                upload_info = storage_api.upload_product(temp_file.name, s3key, facts)
+                img_metadata = storage_api.create_and_upload_images(temp_file.name, s3key, uuid,
+                                                                    info['product'], legacy=True)
+                payload = utils.create_product_put_payload(temp_file.name,
+                                                           upload_info,
+                                                           product=info['product'],
+                                                           date_str=info['date_str'],
+                                                           site=site,
+                                                           facts=facts)
+                payload['legacy'] = True
+                md_api.put(s3key, payload)
+                for data in img_metadata:
+                    md_api.put_img(data, uuid)
+
+                temp_file.close()
+    finally:
+        storage_api.close()
 
 
 class LegacyFile:
@@ -9,13 +9,14 @@ setup(name='data_processing',
                         'pytest',
                         'requests',
                         'requests_mock',
+                        'urllib3>=1.26',
                         ],
       include_package_data=True,
       package_dir={"": "src"},
       packages=find_packages(where="src"),
-      python_requires='>=3.6',
+      python_requires='>=3.7',
       classifiers=[
-          "Programming Language :: Python :: 3.6",
+          "Programming Language :: Python :: 3.7",
           "License :: OSI Approved :: MIT License",
           "Intended Audience :: Science/Research",
           "Topic :: Scientific/Engineering",
@@ -0,0 +1,57 @@
+"""Registry of products created or downloaded during a processing run."""
+import os
+import shutil
+import threading
+from os import path
+from tempfile import TemporaryDirectory
+from typing import Union
+
+
+class ArtifactRegistry:
+    """Keeps local copies of the products uploaded or downloaded during a run for downstream
+    processing.
+
+    Products are addressed by (date, product) and identified by their uuid, so a
+    downstream step can check that the local copy is the file it would otherwise
+    download from the storage service.
+    """
+
+    def __init__(self):
+        self._temp_dir = None
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def add(self, date_str: str, product: str, full_path: str, uuid: str,
+            filename: str) -> str:
+        """Stores a copy of a product file under its filename. Returns path of the copy."""
+        with self._lock:
+            if self._temp_dir is None:
+                self._temp_dir = TemporaryDirectory()
+            dir_name = path.join(self._temp_dir.name, date_str, uuid)
+            os.makedirs(dir_name, exist_ok=True)
+            artifact = path.join(dir_name, filename)
+            try:
+                os.link(full_path, artifact)
+            except OSError:
+                shutil.copyfile(full_path, artifact)
+            self._artifacts.setdefault((date_str, product), {})[uuid] = artifact
+        return artifact
+
+    def get(self, date_str: str, product: str, uuid: str) -> Union[str, None]:
+        """Returns path of the product file with given uuid, if created in this run."""
+        with self._lock:
+            return self._artifacts.get((date_str, product), {}).get(uuid)
+
+    def release(self, date_str: str) -> None:
+        """Removes products of a date."""
+        with self._lock:
+            self._artifacts = {key: value for key, value in self._artifacts.items()
+                               if key[0] != date_str}
+            if self._temp_dir is not None:
+                shutil.rmtree(path.join(self._temp_dir.name, date_str), ignore_errors=True)
@@ -0,0 +1,123 @@
+"""Catalog of Cloudnet products, sites and models."""
+import os
+import json
+import time
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Union
+import requests
+from requests.exceptions import RequestException
+from data_processing import transport
+
+
+class Catalog:
+    """Class serving Cloudnet product, site and model listings of the metadata server.
+
+    Each listing is kept in memory and read again once it is older than the configured
+    time-to-live, so that long-running processes see catalog changes. Fetched listings are
+    also stored in an on-disk cache which is used instead of the server while it is
+    younger than the time-to-live. In offline mode the cache is always used and
+    the server is never contacted.
+
+    Args:
+        config (dict): Main config with METADATASERVER and (optional) CATALOG sections.
+        session (Session, optional): Session used for requests.
+
+    """
+
+    def __init__(self, config: dict, session: requests.Session = None):
+        self.session = session or transport.create_session(config)
+        self._url = config['METADATASERVER']['url']
+        catalog_config = config['CATALOG'] if 'CATALOG' in config else {}
+        self._cache_dir = catalog_config.get('cache_dir', './cache/catalog')
+        self._ttl = float(catalog_config.get('ttl_hours', 24)) * 3600
+        self._offline = str(catalog_config.get('offline', False)).lower() == 'true'
+        self._listings = {}
+
+    def get_product_types(self, level: int = None) -> list:
+        """Return Cloudnet processing types."""
+        return select_product_types(self._get_listing('products'), level)
+
+    def get_site_info(self, site_name: str) -> dict:
+        """Return site information."""
+        return find_site(self._get_listing('sites'), site_name)
+
+    def get_model_types(self) -> list:
+        """Return model ids."""
+        return select_model_types(self._get_listing('models'))
+
+    def _get_listing(self, name: str) -> list:
+        loaded_at, listing = self._listings.get(name, (None, None))
+        if loaded_at is None or time.time() - loaded_at >= self._ttl:
+            listing = self._read_listing(name)
+            self._listings[name] = (time.time(), listing)
+        return listing
+
+    def _read_listing(self, name: str) -> list:
+        cache_file = path.join(self._cache_dir, f'{name}.json')
+        cache_age = _get_age(cache_file)
+        if cache_age is not None and (self._offline or cache_age < self._ttl):
+            return _read_json(cache_file)
+        if self._offline:
+            raise RuntimeError(f'Offline mode and no cached {name} in {self._cache_dir}')
+        try:
+            listing = self._fetch(name)
+        except RequestException:
+            if cache_age is None:
+                raise
+            print(f'Warning: using outdated {name} catalog', end='\t')
+            return _read_json(cache_file)
+        self._write_cache(cache_file, listing)
+        return listing
+
+    def _fetch(self, name: str) -> list:
+        url = path.join(self._url, 'api', name)
+        params = {'developer': True} if name == 'sites' else {}
+        res = self.session.get(url, params=params)
+        res.raise_for_status()
+        return res.json()
+
+    def _write_cache(self, cache_file: str, listing: list) -> None:
+        os.makedirs(self._cache_dir, exist_ok=True)
+        with NamedTemporaryFile('w', dir=self._cache_dir, delete=False) as file:
+            json.dump(listing, file)
+        os.replace(file.name, cache_file)
+
+
+def select_product_types(products: list, level: int = None) -> list:
+    """Return Cloudnet processing types of the given level from product listing."""
+    l1_types = [product['id'] for product in products if int(product['level']) == 1]
+    l2_types = [product['id'] for product in products if int(product['level']) == 2]
+    l1_types.remove('categorize')
+    if level == 1:
+        return l1_types
+    if level == 2:
+        return l2_types
+    return l1_types + ['categorize'] + l2_types
+
+
+def find_site(sites: list, site_name: str) -> Union[dict, None]:
+    """Return site information from site listing."""
+    for site in sites:
+        if site['id'] == site_name:
+            site = dict(site)
+            site['name'] = site.pop('humanReadableName')
+            return site
+    return None
+
+
+def select_model_types(models: list) -> list:
+    """Return model ids from model listing."""
+    return [model['id'] for model in models]
+
+
+def _get_age(filename: str) -> Union[float, None]:
+    try:
+        return time.time() - path.getmtime(filename)
+    except OSError:
+        return None
+
+
+def _read_json(filename: str) -> list:
+    with open(filename) as file:
+        return json.load(file)
@@ -0,0 +1,112 @@
+"""Compression and chunking profiles of written netCDF files."""
+from typing import Union
+import netCDF4
+
+CONSTANT = 'constant'
+SERIES = 'series'
+PROFILE = 'profile'
+DEFAULT_PROFILE = 'default'
+
+
+class Profile:
+    """Compression, chunking and chunk cache of written variables by variable role.
+
+    Variables without a time dimension are constants, time-dependent variables with one
+    dimension are series, and time-dependent variables with more dimensions are profiles.
+
+    Args:
+        name (str): Name of the profile.
+        roles (dict): Settings of each role (CONSTANT, SERIES and PROFILE) as a dict with
+            keys `complevel` (zlib level, 0 for no compression), `shuffle`, `chunk_bytes`
+            (target size of a chunk of whole profiles along time, None for automatic
+            chunking) and `cache_bytes` (HDF5 chunk cache of the variable, None for the
+            library default).
+
+    """
+
+    def __init__(self, name: str, roles: dict):
+        self.name = name
+        self.roles = roles
+
+    def get_options(self, file: netCDF4.Dataset, dimensions: tuple, itemsize: int,
+                    time_dim: str = 'time') -> dict:
+        """Returns keyword arguments of `createVariable` for a new variable of a file."""
+        settings = self.roles[get_role(dimensions, time_dim)]
+        options = {'zlib': settings['complevel'] > 0, 'shuffle': settings['shuffle']}
+        if settings['complevel'] > 0:
+            options['complevel'] = settings['complevel']
+        if dimensions and settings.get('chunk_bytes'):
+            options['chunksizes'] = get_chunk_sizes(file, dimensions, itemsize,
+                                                    settings['chunk_bytes'])
+        return options
+
+    def set_chunk_cache(self, variable: netCDF4.Variable, time_dim: str = 'time') -> None:
+        """Sets HDF5 chunk cache of a variable."""
+        cache_bytes = self.roles[get_role(variable.dimensions, time_dim)].get('cache_bytes')
+        if cache_bytes:
+            variable.set_var_chunk_cache(size=cache_bytes)
+
+
+def _role(complevel: int, shuffle: bool, chunk_bytes: Union[int, None] = None,
+          cache_bytes: Union[int, None] = None) -> dict:
+    return {'complevel': complevel, 'shuffle': shuffle, 'chunk_bytes': chunk_bytes,
+            'cache_bytes': cache_bytes}
+
+
+PROFILES = {
+    DEFAULT_PROFILE: Profile(DEFAULT_PROFILE, {
+        CONSTANT: _role(3, False),
+        SERIES: _role(3, False, 1024**2),
+        PROFILE: _role(3, False, 1024**2),
+    }),
+    'fast-write': Profile('fast-write', {
+        CONSTANT: _role(0, False),
+        SERIES: _role(1, False, 4 * 1024**2),
+        PROFILE: _role(1, False, 4 * 1024**2, 64 * 1024**2),
+    }),
+    'archive-small': Profile('archive-small', {
+        CONSTANT: _role(9, True),
+        SERIES: _role(9, True, 1024**2),
+        PROFILE: _role(9, True, 4 * 1024**2, 64 * 1024**2),
+    }),
+}
+
+
+def get_profile(name: Union[str, None] = None) -> Profile:
+    """Returns profile by name. Default profile is returned if name is not given."""
+    try:
+        return PROFILES[name or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f'Unknown compression profile: {name}')
+
+
+def get_configured_profile(config: dict) -> Union[Profile, None]:
+    """Returns profile set in the optional COMPRESSION section, or None if not set."""
+    if 'COMPRESSION' not in config or 'profile' not in config['COMPRESSION']:
+        return None
+    return get_profile(config['COMPRESSION']['profile'])
+
+
+def get_role(dimensions: tuple, time_dim: str = 'time') -> str:
+    """Returns role (CONSTANT, SERIES or PROFILE) of a variable with given dimensions."""
+    if time_dim not in dimensions:
+        return CONSTANT
+    if len(dimensions) == 1:
+        return SERIES
+    return PROFILE
+
+
+def get_chunk_sizes(file: netCDF4.Dataset, dimensions: tuple, itemsize: int,
+                    chunk_bytes: int) -> Union[list, None]:
+    """Returns chunks of whole profiles along the first dimension, about chunk_bytes each."""
+    if not dimensions:
+        return None
+    sizes = [file.dimensions[dim].size for dim in dimensions]
+    profile_bytes = itemsize
+    for size in sizes[1:]:
+        profile_bytes *= max(size, 1)
+    n_profiles = chunk_bytes // profile_bytes
+    if not file.dimensions[dimensions[0]].isunlimited():
+        n_profiles = min(sizes[0], n_profiles)
+    sizes[0] = max(1, n_profiles)
+    return [max(size, 1) for size in sizes]
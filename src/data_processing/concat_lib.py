@@ -1,19 +1,33 @@
-"""Module containing helper functions for CH15k concatenation."""
+"""Module containing helper functions for concatenating raw instrument files."""
+import re
+from os import path
+from contextlib import ExitStack
+from typing import Callable, Union
+import numpy as np
 import netCDF4
-from cloudnetpy import utils
+from data_processing import compression
 
 
 CONSTANTS = ['range', 'wavelength', 'scaling', 'zenith']
 VARIABLES = ['time', 'beta_raw', 'stddev', 'nn1', 'nn2', 'nn3']
+CHM15K_FILENAME_PATTERN = r'_A(\d{8})\d*_'
+BLOCK_BYTES = 64 * 1024**2
 
 
-def concat_chm15k_files(files: list, date: str, output_file: str) -> list:
-    """ Concatenate several small chm15k files into a daily file.
+def concat_files(instrument: str, files: list, date: str, output_file: str,
+                 unlimited_time: bool = False,
+                 profile: compression.Profile = None) -> list:
+    """Concatenate raw files of an instrument into a daily file.
 
     Args:
-        files (list): List of file to be concatenated.
+        instrument (str): Instrument id, e.g., chm15k. See CONCATENATORS.
+        files (list): List of files to be concatenated.
         date (str): Measurement date 'YYYY-MM-DD'.
-        output_file (str): Output file name, e.g., 20201012_bucharest_chm15k.nc.
+        output_file (str): Output file name.
+        unlimited_time (bool, optional): If True, files can be appended to the output
+            later with append_files.
+        profile (Profile, optional): Compression profile of the output. Default profile
+            is used if not given.
 
     Returns:
         list: List of files that were valid and actually used in the concatenation.
@@ -22,35 +36,233 @@ def concat_chm15k_files(files: list, date: str, output_file: str) -> list:
         ValueError: No valid files to be concatenated.
 
     """
+    return CONCATENATORS[instrument].concat(files, date, output_file, unlimited_time,
+                                            profile or compression.get_profile())
 
-    files.sort()
-    valid_files = _remove_files_with_wrong_date(files, date)
-    if len(valid_files) == 0:
-        raise ValueError
-    file_new = netCDF4.Dataset(output_file, 'w', format='NETCDF4_CLASSIC')
-    first_file_of_day = netCDF4.Dataset(valid_files[0])
-    _create_dimensions(file_new, first_file_of_day)
-    _create_global_attributes(file_new, first_file_of_day)
-    _write_initial_data(file_new, first_file_of_day)
-
-    if len(valid_files) > 1:
-        for file in valid_files[1:]:
-            _append_data(file_new, netCDF4.Dataset(file))
-
-    file_new.close()
-    return valid_files
 
+def append_files(instrument: str, files: list, date: str, daily_file: str,
+                 profile: compression.Profile = None) -> list:
+    """Append raw files of an instrument to the end of a daily file.
+
+    Args:
+        instrument (str): Instrument id, e.g., chm15k. See CONCATENATORS.
+        files (list): List of files to be appended.
+        date (str): Measurement date 'YYYY-MM-DD'.
+        daily_file (str): Daily file created by concat_files with `unlimited_time`.
+        profile (Profile, optional): Compression profile whose chunk cache is used.
+
+    Returns:
+        list: List of files that were valid and actually appended.
+
+    Raises:
+        ValueError: A file does not start after the end of the daily file.
+
+    """
+    return CONCATENATORS[instrument].append(files, date, daily_file,
+                                            profile or compression.get_profile())
+
+
+class NetCDFConcatenator:
+    """Concatenates netCDF files along their time dimension.
+
+    Args:
+        constants (list): Variables copied from the first file.
+        variables (list): Time-dependent variables concatenated from all files.
+        time_dim (str, optional): Name of the time dimension. Default is 'time'.
+        validate (function, optional): Returns True if an open dataset has data of the
+            date given as [year, month, day]. Default checks the date attributes.
+        filename_pattern (str, optional): Regular expression capturing 'YYYYMMDD' from
+            the file name, used to skip files of other dates without opening them.
+
+    """
+
+    suffix = '.nc'
+
+    def __init__(self, constants: list, variables: list, time_dim: str = 'time',
+                 validate: Callable = None, filename_pattern: str = None):
+        self.constants = constants
+        self.variables = variables
+        self.time_dim = time_dim
+        self.validate = validate or _validate_date_attributes
+        self.filename_pattern = filename_pattern
+
+    def concat(self, files: list, date: str, output_file: str, unlimited_time: bool,
+               profile: compression.Profile) -> list:
+        """Concatenates files into a new file. Returns the valid files."""
+        with ExitStack() as stack:
+            datasets = self._open_valid_files(files, date, stack)
+            if len(datasets) == 0:
+                raise ValueError
+            n_time = sum(len(nc.dimensions[self.time_dim]) for nc in datasets.values())
+            first_file_of_day = next(iter(datasets.values()))
+            with netCDF4.Dataset(output_file, 'w', format='NETCDF4_CLASSIC') as file_new:
+                self._create_dimensions(file_new, first_file_of_day,
+                                        None if unlimited_time else n_time)
+                _create_global_attributes(file_new, first_file_of_day)
+                self._create_variables(file_new, first_file_of_day, profile)
+                self._write_files(file_new, datasets, 0)
+        return list(datasets.keys())
+
+    def append(self, files: list, date: str, daily_file: str,
+               profile: compression.Profile) -> list:
+        """Appends files to an existing file. Returns the valid files."""
+        with ExitStack() as stack:
+            datasets = self._open_valid_files(files, date, stack)
+            with netCDF4.Dataset(daily_file, 'a') as file_base:
+                file_base.set_auto_mask(False)
+                self._check_order(file_base, datasets)
+                for key in self.variables:
+                    profile.set_chunk_cache(file_base[key], self.time_dim)
+                self._write_files(file_base, datasets,
+                                  len(file_base.dimensions[self.time_dim]))
+        return list(datasets.keys())
+
+    def _check_order(self, file_base: netCDF4.Dataset, datasets: dict) -> None:
+        """Raise ValueError, before anything is written, if a file does not start after
+        the end of the daily file and the files appended before it."""
+        n_time = len(file_base.dimensions[self.time_dim])
+        last_time = file_base[self.time_dim][n_time - 1] if n_time > 0 else None
+        for file, nc in datasets.items():
+            time = nc[self.time_dim]
+            if len(time) == 0:
+                continue
+            if last_time is not None and time[0] <= last_time:
+                raise ValueError(f'{file} does not start after end of daily file')
+            last_time = time[len(time) - 1]
+
+    def _open_valid_files(self, files: list, date: str, stack: ExitStack) -> dict:
+        """Return datasets of valid files in file name order. All opened files are kept
+        open until the stack is closed, so that each file is opened only once."""
+        if self.filename_pattern:
+            files = _remove_files_with_wrong_filename_date(files, date, self.filename_pattern)
+        date_as_ints = [int(x) for x in date.split('-')]
+        datasets = {}
+        for file in sorted(files):
+            nc = stack.enter_context(netCDF4.Dataset(file))
+            if self.validate(nc, date_as_ints):
+                nc.set_auto_mask(False)
+                datasets[file] = nc
+        return datasets
 
-def _remove_files_with_wrong_date(files: list, date: str) -> list:
-    """Remove files that contain wrong date."""
-    date = date.split('-')
-    date_as_ints = [int(x) for x in date]
+    def _create_dimensions(self, file_new: netCDF4.Dataset, file_source: netCDF4.Dataset,
+                           n_time: Union[int, None]) -> None:
+        file_new.createDimension(self.time_dim, n_time)
+        for key in self.constants + self.variables:
+            for dim in file_source[key].dimensions:
+                if dim not in file_new.dimensions:
+                    file_new.createDimension(dim, len(file_source.dimensions[dim]))
+
+    def _create_variables(self, file_new: netCDF4.Dataset, file_source: netCDF4.Dataset,
+                          profile: compression.Profile) -> None:
+        """Create variables, writing the constants. Time-dependent data is written later."""
+        for key in self.constants + self.variables:
+            source_var = file_source[key]
+            dtype = _get_dtype(key, source_var)
+            dimensions = source_var.dimensions
+            options = profile.get_options(file_new, dimensions, np.dtype(dtype).itemsize,
+                                          self.time_dim)
+            var = file_new.createVariable(key, dtype, dimensions, **options)
+            profile.set_chunk_cache(var, self.time_dim)
+            var.set_auto_mask(False)
+            if key in self.constants:
+                var[:] = source_var[:]
+            _copy_attributes(source_var, var)
+
+    def _write_files(self, file_base: netCDF4.Dataset, datasets: dict, ind0: int) -> None:
+        for nc in datasets.values():
+            n_time = len(nc.dimensions[self.time_dim])
+            if n_time == 0:
+                continue
+            for key in self.variables:
+                _copy_time_blocks(nc[key], file_base[key], ind0)
+            ind0 += n_time
+
+
+class TextConcatenator:
+    """Concatenates text files consisting of messages that start with a timestamp line.
+
+    Files are streamed line by line, keeping the messages of the measurement date.
+
+    Args:
+        timestamp_pattern (bytes): Regular expression matching the first line of a message
+            and capturing its date as 'YYYY-MM-DD'. The matched timestamps must sort in
+            time order, e.g., 'YYYY-MM-DD HH:MM:SS'.
+        suffix (str, optional): File name suffix of the instrument files.
+
+    """
+
+    def __init__(self, timestamp_pattern: bytes, suffix: str = '.DAT'):
+        self.timestamp_pattern = re.compile(timestamp_pattern)
+        self.suffix = suffix
+
+    def concat(self, files: list, date: str, output_file: str, unlimited_time: bool,
+               profile: compression.Profile) -> list:  # pylint: disable=unused-argument
+        """Concatenates files into a new file. Returns the valid files."""
+        with open(output_file, 'wb') as output:
+            valid_files = self._write_files(output, files, date)
+        if len(valid_files) == 0:
+            raise ValueError
+        return valid_files
+
+    def append(self, files: list, date: str, daily_file: str,
+               profile: compression.Profile) -> list:  # pylint: disable=unused-argument
+        """Appends files to an existing file. Returns the valid files."""
+        self._check_order(daily_file, files, date)
+        with open(daily_file, 'ab') as output:
+            return self._write_files(output, files, date)
+
+    def _check_order(self, daily_file: str, files: list, date: str) -> None:
+        """Raise ValueError, before anything is written, if a file does not start after
+        the end of the daily file and the files appended before it."""
+        _, last_time = self._read_time_range(daily_file, date)
+        for file in sorted(files):
+            first_time, end_time = self._read_time_range(file, date)
+            if first_time is None:
+                continue
+            if last_time is not None and first_time <= last_time:
+                raise ValueError(f'{file} does not start after end of daily file')
+            last_time = end_time
+
+    def _read_time_range(self, file: str, date: str) -> tuple:
+        """Return first and last timestamp of the messages of the date in a file."""
+        date = date.encode()
+        first_time, last_time = None, None
+        with open(file, 'rb') as source:
+            for line in source:
+                match = self.timestamp_pattern.match(line)
+                if match and match.group(1) == date:
+                    first_time = first_time or match.group(0)
+                    last_time = match.group(0)
+        return first_time, last_time
+
+    def _write_files(self, output, files: list, date: str) -> list:
+        date = date.encode()
+        valid_files = []
+        for file in sorted(files):
+            is_valid = False
+            with open(file, 'rb') as source:
+                is_date = False
+                for line in source:
+                    match = self.timestamp_pattern.match(line)
+                    if match:
+                        is_date = match.group(1) == date
+                    if is_date:
+                        output.write(line)
+                        is_valid = True
+            if is_valid:
+                valid_files.append(file)
+        return valid_files
+
+
+def _remove_files_with_wrong_filename_date(files: list, date: str,
+                                           pattern: str = CHM15K_FILENAME_PATTERN) -> list:
+    """Remove files whose name has a timestamp of another date. Other files are kept."""
+    date_in_filename = date.replace('-', '')
     valid_files = []
     for file in files:
-        nc = netCDF4.Dataset(file)
-        if _validate_date_attributes(nc, date_as_ints):
+        match = re.search(pattern, path.basename(file))
+        if match is None or match.group(1) == date_in_filename:
             valid_files.append(file)
-        nc.close()
     return valid_files
 
 
@@ -61,12 +273,6 @@ def _validate_date_attributes(obj: netCDF4.Dataset, date: list) -> bool:
     return True
 
 
-def _create_dimensions(file_new: netCDF4.Dataset, file_source: netCDF4.Dataset) -> None:
-    n_range = len(file_source['range'])
-    file_new.createDimension('time', None)
-    file_new.createDimension('range', n_range)
-
-
 def _create_global_attributes(file_new: netCDF4.Dataset, file_source: netCDF4.Dataset) -> None:
     file_new.Conventions = 'CF-1.7'
     _copy_attributes(file_source, file_new)
@@ -78,24 +284,15 @@ def _copy_attributes(source: netCDF4.Dataset, target: netCDF4.Dataset) -> None:
         setattr(target, attr, str(value))
 
 
-def _write_initial_data(file_new: netCDF4.Dataset, file_source: netCDF4.Dataset) -> None:
-    for key in CONSTANTS + VARIABLES:
-        array = file_source[key][:]
-        var = file_new.createVariable(key, _get_dtype(key, array), _get_dim(file_new, array),
-                                      zlib=True, complevel=3, shuffle=False)
-        var[:] = array
-        _copy_attributes(file_source[key], var)
-
-
-def _append_data(file_base: netCDF4.Dataset, file: netCDF4.Dataset) -> None:
-    ind0 = len(file_base.variables['time'])
-    ind1 = ind0 + len(file.variables['time'])
-    for key in VARIABLES:
-        array = file[key][:]
-        if array.ndim == 1:
-            file_base.variables[key][ind0:ind1] = array
-        else:
-            file_base.variables[key][ind0:ind1, :] = array
+def _copy_time_blocks(source: netCDF4.Variable, target: netCDF4.Variable, ind0: int) -> None:
+    """Copy a time-dependent variable in blocks of at most BLOCK_BYTES."""
+    profile_bytes = source.dtype.itemsize
+    for size in source.shape[1:]:
+        profile_bytes *= size
+    block_size = max(1, BLOCK_BYTES // max(1, profile_bytes))
+    for start in range(0, source.shape[0], block_size):
+        block = source[start:start + block_size]
+        target[ind0 + start:ind0 + start + len(block)] = block
 
 
 def _get_dtype(key: str, array) -> str:
@@ -107,17 +304,7 @@ def _get_dtype(key: str, array) -> str:
     return 'f4'
 
 
-def _get_dim(file: netCDF4.Dataset, array) -> tuple:
-    """Returns tuple of dimension names, e.g., (time, range) that match the array size."""
-    if utils.isscalar(array):
-        return ()
-    variable_size = ()
-    file_dims = file.dimensions
-    for length in array.shape:
-        try:
-            dim = [key for key in file_dims.keys()
-                   if file_dims[key].size == length][0]
-        except IndexError:
-            dim = 'time'
-        variable_size = variable_size + (dim,)
-    return variable_size
+CONCATENATORS = {
+    'chm15k': NetCDFConcatenator(CONSTANTS, VARIABLES, filename_pattern=CHM15K_FILENAME_PATTERN),
+    'cl51': TextConcatenator(rb'-(\d{4}-\d{2}-\d{2}) \d{2}:\d{2}:\d{2}'),
+}
@@ -0,0 +1,124 @@
+"""On-disk cache of concatenated daily raw files."""
+import os
+import json
+import time
+import shutil
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Tuple, Union
+
+
+class DailyFileCache:
+    """Keeps concatenated daily raw files with a manifest of the raw files they contain.
+
+    The manifest lists the uploads (uuid, checksum, filename and whether the file was
+    valid) in the order they were concatenated. When new uploads arrive, only those sorting
+    after the already concatenated ones need to be appended. If an earlier upload changes
+    or a new upload sorts before the concatenated ones, the daily file must be rebuilt.
+    Daily files of a date not modified for longer than the maximum age are removed.
+
+    Args:
+        cache_dir (str): Cache directory.
+        max_age (float): Maximum age of unmodified daily files in seconds.
+
+    """
+
+    def __init__(self, cache_dir: str, max_age: float):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+    def get_path(self, site: str, date_str: str, name: str) -> str:
+        """Returns path of a daily file. The directory is created if needed."""
+        dir_name = path.join(self.cache_dir, site, date_str)
+        os.makedirs(dir_name, exist_ok=True)
+        return path.join(dir_name, name)
+
+    def get_new_uploads(self, site: str, date_str: str, name: str,
+                        upload_metadata: list) -> Tuple[list, list]:
+        """Returns manifest of the cached daily file and the uploads missing from it.
+
+        Args:
+            site (str): Site id.
+            date_str (str): Date as "YYYY-MM-DD".
+            name (str): File name of the daily file, e.g., chm15k.nc.
+            upload_metadata (list): Upload metadata of all raw files of the day.
+
+        Returns:
+            tuple: Manifest entries and uploads (sorted by filename) to be appended. If the
+                daily file must be rebuilt, the manifest is empty and all uploads are returned.
+
+        """
+        upload_metadata = sorted(upload_metadata, key=lambda row: row['filename'])
+        manifest = self._read_manifest(site, date_str, name)
+        if manifest is None or not path.isfile(self.get_path(site, date_str, name)):
+            return [], upload_metadata
+        n_files = len(manifest)
+        cached = [(entry['uuid'], entry.get('checksum')) for entry in manifest]
+        current = [(row['uuid'], row.get('checksum')) for row in upload_metadata[:n_files]]
+        if cached != current:
+            return [], upload_metadata
+        return manifest, upload_metadata[n_files:]
+
+    def save_manifest(self, site: str, date_str: str, name: str, manifest: list) -> None:
+        """Writes manifest of a daily file."""
+        filename = self._get_manifest_path(site, date_str, name)
+        with NamedTemporaryFile('w', dir=path.dirname(filename), delete=False) as file:
+            json.dump(manifest, file)
+        os.replace(file.name, filename)
+        self._prune()
+
+    def invalidate(self, site: str, date_str: str, name: str) -> None:
+        """Removes manifest of a daily file before the file is modified."""
+        try:
+            os.remove(self._get_manifest_path(site, date_str, name))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self) -> None:
+        """Removes directories of dates whose daily files are older than the maximum age."""
+        now = time.time()
+        for site_dir in os.scandir(self.cache_dir):
+            if not site_dir.is_dir():
+                continue
+            for date_dir in os.scandir(site_dir.path):
+                age = _get_age(date_dir.path, now)
+                if age is not None and age > self.max_age:
+                    shutil.rmtree(date_dir.path, ignore_errors=True)
+
+    def _read_manifest(self, site: str, date_str: str, name: str) -> Union[list, None]:
+        try:
+            with open(self._get_manifest_path(site, date_str, name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _get_manifest_path(self, site: str, date_str: str, name: str) -> str:
+        return path.join(self.cache_dir, site, date_str, f'{name}.json')
+
+
+def get_manifest_entries(upload_metadata: list, full_paths: list, valid_full_paths: list) -> list:
+    """Returns manifest entries of concatenated uploads."""
+    return [{'uuid': row['uuid'],
+             'checksum': row.get('checksum'),
+             'filename': row['filename'],
+             'valid': full_path in valid_full_paths}
+            for row, full_path in zip(upload_metadata, full_paths)]
+
+
+def create_daily_file_cache(config: dict) -> Union[DailyFileCache, None]:
+    """Returns DailyFileCache configured in the DAILY-FILE-CACHE section, or None."""
+    if 'DAILY-FILE-CACHE' not in config:
+        return None
+    cache_config = config['DAILY-FILE-CACHE']
+    max_age = float(cache_config.get('max_age_days', 7)) * 24 * 3600
+    return DailyFileCache(cache_config.get('cache_dir', './cache/daily'), max_age)
+
+
+def _get_age(dir_name: str, now: float) -> Union[float, None]:
+    """Returns time since the directory or a file in it was last modified."""
+    try:
+        mtimes = [path.getmtime(dir_name)] + [entry.stat().st_mtime
+                                              for entry in os.scandir(dir_name)]
+    except OSError:
+        return None
+    return now - max(mtimes)
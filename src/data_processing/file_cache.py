@@ -0,0 +1,122 @@
+"""On-disk cache of downloaded Cloudnet files."""
+import os
+import shutil
+import threading
+from os import path
+from typing import Union
+from tempfile import NamedTemporaryFile
+from data_processing import utils
+
+
+class FileCache:
+    """Content-addressed cache of raw and product files, shared by concurrent processes.
+
+    Files are stored under their checksum, so a cached file is valid for every upload or
+    product version with the same content. Files are written to a temporary file first and
+    renamed in place, so other processes never see partial files. Files are checked
+    against their checksum when read from the cache. When the cache grows over its size
+    limit, least recently used files are removed.
+
+    Args:
+        cache_dir (str): Cache directory.
+        max_size (int): Maximum total size of cached files in bytes.
+
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, checksum: str, full_path: str, hash_method: str = 'md5') -> bool:
+        """Copies cached file to `full_path`. Returns False if file is not in the cache."""
+        cached_file = self._get_cache_path(checksum)
+        try:
+            shutil.copyfile(cached_file, full_path)
+            os.utime(cached_file)
+        except OSError:
+            self._count(is_hit=False)
+            return False
+        if _calc_checksum(full_path, hash_method) != checksum:
+            _remove(cached_file)
+            os.remove(full_path)
+            self._count(is_hit=False)
+            return False
+        self._count(is_hit=True)
+        return True
+
+    def put(self, checksum: str, full_path: str) -> None:
+        """Adds file to the cache."""
+        cached_file = self._get_cache_path(checksum)
+        if path.isfile(cached_file):
+            return
+        os.makedirs(path.dirname(cached_file), exist_ok=True)
+        with NamedTemporaryFile(dir=self.cache_dir, prefix='.tmp-', delete=False) as temp_file:
+            with open(full_path, 'rb') as file:
+                shutil.copyfileobj(file, temp_file)
+        os.replace(temp_file.name, cached_file)
+        self._evict()
+
+    def get_summary(self) -> str:
+        return f'{self.hits} hits, {self.misses} misses'
+
+    def _get_cache_path(self, checksum: str) -> str:
+        return path.join(self.cache_dir, checksum[:2], checksum)
+
+    def _count(self, is_hit: bool) -> None:
+        with self._lock:
+            if is_hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _evict(self) -> None:
+        files = []
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, filename in sorted(files):
+            if total_size <= self.max_size:
+                break
+            _remove(filename)
+            total_size -= size
+
+
+def create_file_cache(config: dict) -> Union[FileCache, None]:
+    """Returns FileCache configured in the FILE-CACHE section, or None if not configured."""
+    if 'FILE-CACHE' not in config:
+        return None
+    cache_config = config['FILE-CACHE']
+    max_size = int(float(cache_config.get('max_size_gb', 10)) * 1024**3)
+    return FileCache(cache_config.get('cache_dir', './cache/files'), max_size)
+
+
+def _calc_checksum(full_path: str, hash_method: str) -> str:
+    if hash_method == 'sha256':
+        return utils.sha256sum(full_path)
+    return utils.md5sum(full_path)
+
+
+def _remove(filename: str) -> None:
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,54 @@
+"""Fingerprints of the input files of Cloudnet products."""
+import os
+import json
+import hashlib
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Union
+
+
+def get_fingerprint(input_metadata: list, cloudnetpy_version: str) -> str:
+    """Returns fingerprint of product inputs.
+
+    Args:
+        input_metadata (list): File metadata of the input products.
+        cloudnetpy_version (str): Version of CloudnetPy used in processing.
+
+    Returns:
+        str: Fingerprint that changes when any input file or CloudnetPy version changes.
+
+    """
+    inputs = sorted((row['uuid'], row.get('checksum', '')) for row in input_metadata)
+    data = json.dumps({'inputs': inputs, 'cloudnetpyVersion': cloudnetpy_version})
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class FingerprintStore:
+    """Stores input fingerprints of created products on disk, one file per product.
+
+    Args:
+        store_dir (str): Root directory of the stored fingerprints.
+
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+
+    def get(self, site: str, date_str: str, product: str) -> Union[dict, None]:
+        """Returns fingerprint and uuid of the product created last."""
+        try:
+            with open(self._get_filename(site, date_str, product)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, site: str, date_str: str, product: str, fingerprint: str, uuid: str) -> None:
+        """Stores fingerprint of a created product."""
+        filename = self._get_filename(site, date_str, product)
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        with NamedTemporaryFile('w', dir=path.dirname(filename), delete=False) as file:
+            json.dump({'fingerprint': fingerprint, 'uuid': uuid}, file)
+        os.replace(file.name, filename)
+
+    def _get_filename(self, site: str, date_str: str, product: str) -> str:
+        return path.join(self.store_dir, site, date_str, f'{product}.json')
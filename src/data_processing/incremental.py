@@ -0,0 +1,100 @@
+"""Incremental processing driven by metadata changes since the previous run."""
+import os
+import json
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Union
+from data_processing.metadata_api import MetadataApi
+
+
+class Cursor:
+    """Latest seen modification times (`updatedAt`) of the uploads and products of a site.
+
+    Args:
+        cursor_dir (str): Directory of the cursor files.
+        site (str): Site id.
+
+    """
+
+    def __init__(self, cursor_dir: str, site: str):
+        self.filename = path.join(cursor_dir, f'{site}.json')
+        try:
+            with open(self.filename) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            data = {}
+        self.uploads = data.get('uploads')
+        self.files = data.get('files')
+
+    def save(self) -> None:
+        """Writes cursor to disk."""
+        dir_name = path.dirname(self.filename)
+        os.makedirs(dir_name, exist_ok=True)
+        with NamedTemporaryFile('w', dir=dir_name, delete=False) as file:
+            json.dump({'uploads': self.uploads, 'files': self.files}, file)
+        os.replace(file.name, self.filename)
+
+
+def fetch_changes(md_api: MetadataApi, site: str, end_point: str,
+                  updated_since: Union[str, None], date_from: str, date_to: str) -> list:
+    """Returns upload or file metadata of a site modified after the given time.
+
+    Without the time (i.e., on the first run), returns metadata of the dates from
+    `date_from` to `date_to` (both included) instead of the whole history of the site.
+    """
+    payload = {
+        'site': site,
+        'developer': True
+    }
+    if end_point == 'api/files':
+        payload['allModels'] = True
+    if updated_since:
+        payload['updatedAtFrom'] = updated_since
+    else:
+        payload['dateFrom'] = date_from
+        payload['dateTo'] = date_to
+    metadata = md_api.get(end_point, payload)
+    return [row for row in metadata if not updated_since or row['updatedAt'] > updated_since]
+
+
+def get_latest_update(metadata: list, default: Union[str, None]) -> Union[str, None]:
+    """Returns latest `updatedAt` of metadata rows, or default if there are none."""
+    return max([row['updatedAt'] for row in metadata] + ([default] if default else []),
+               default=None)
+
+
+def plan_jobs(uploads: list, files: list, l1_products: list, l2_products: list) -> dict:
+    """Returns products to process for each date.
+
+    Args:
+        uploads (list): Upload metadata of raw files waiting for processing.
+        files (list): File metadata of products that have changed.
+        l1_products (list): Level 1 product types.
+        l2_products (list): Level 2 product types.
+
+    Returns:
+        dict: Products (in processing order) to process by date, including every product
+            depending on new raw data or a changed product.
+
+    """
+    all_products = l1_products + ['categorize'] + l2_products
+    jobs = {}
+    for row in uploads:
+        product = 'model' if row['model'] else row['instrument']['type']
+        if product in l1_products:
+            jobs.setdefault(row['measurementDate'], set()).update(
+                [product] + _get_dependents(product, l1_products, l2_products))
+    for row in files:
+        dependents = _get_dependents(row['product']['id'], l1_products, l2_products)
+        if dependents:
+            jobs.setdefault(row['measurementDate'], set()).update(dependents)
+    return {date_str: [product for product in all_products if product in products]
+            for date_str, products in sorted(jobs.items())}
+
+
+def _get_dependents(product: str, l1_products: list, l2_products: list) -> list:
+    if product in l1_products:
+        return ['categorize'] + l2_products
+    if product == 'categorize':
+        return list(l2_products)
+    return []
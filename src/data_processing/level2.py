@@ -0,0 +1,11 @@
+"""Generation of Level 2 products."""
+import importlib
+from typing import Union
+
+
+def generate_product(product: str, categorize_file: str, output_file: str,
+                     uuid: Union[str, None] = None) -> str:
+    """Generates a Level 2 product with CloudnetPy. Returns uuid of the product."""
+    module = importlib.import_module(f'cloudnetpy.products.{product}')
+    fun = getattr(module, f'generate_{product}')
+    return fun(categorize_file, output_file, uuid=uuid)
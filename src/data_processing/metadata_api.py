@@ -1,17 +1,20 @@
 """Metadata API for Cloudnet files."""
 from datetime import timedelta, datetime
 from typing import Union
+from collections import defaultdict
 from os import path
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import requests
-from data_processing import utils
+from data_processing import utils, transport
 
 
 class MetadataApi:
     """Class handling connection between Cloudnet files and database."""
 
-    def __init__(self, config: dict, session=requests.Session()):
+    def __init__(self, config: dict, session: requests.Session = None):
         self.config = config
-        self.session = session
+        self.session = session or transport.create_session(config)
         self._url = config['METADATASERVER']['url']
 
     def get(self, end_point: str, payload: dict) -> Union[list, dict]:
@@ -28,7 +31,7 @@ class MetadataApi:
         res.raise_for_status()
         return res
 
-    def post(self, end_point: str, payload: dict) -> requests.Response:
+    def post(self, end_point: str, payload: Union[dict, list]) -> requests.Response:
         """Update upload / product metadata."""
         url = path.join(self._url, end_point)
         res = self.session.post(url, json=payload)
@@ -80,3 +83,212 @@ class MetadataApi:
     @staticmethod
     def _select_by_extension(metadata: list, extension: str) -> list:
         return [row for row in metadata if row['filename'].lower().endswith(extension.lower())]
+
+
+class MetadataWriter:
+    """Collects the metadata writes of a product and sends them when flushed.
+
+    The file metadata is sent first and the visualizations next, both of which refer
+    to it, and the upload statuses last, so that raw data is not marked processed before
+    its product is registered. Writes of the same kind are sent concurrently, and upload
+    statuses in a single request if bulk updates are enabled (METADATASERVER section,
+    `bulk_status_updates` option).
+
+    Args:
+        md_api (MetadataApi): Metadata API instance used for writing.
+
+    """
+
+    def __init__(self, md_api: MetadataApi):
+        self._md_api = md_api
+        md_config = md_api.config['METADATASERVER']
+        self._max_workers = int(md_config.get('max_concurrent_writes', 8))
+        self._bulk = str(md_config.get('bulk_status_updates', False)).lower() == 'true'
+        self._files = []
+        self._images = []
+        self._statuses = []
+
+    def put(self, s3key: str, payload: dict) -> None:
+        """Queue Cloudnet product metadata."""
+        self._files.append((s3key, payload))
+
+    def put_img(self, data: dict, uuid: str) -> None:
+        """Queue Cloudnet quicklook metadata."""
+        self._images.append((data, uuid))
+
+    def update_statuses(self, uuids: list, status: str) -> None:
+        """Queue status updates of uploaded files."""
+        self._statuses += [{'uuid': uuid, 'status': status} for uuid in uuids]
+
+    def flush(self) -> None:
+        """Send queued writes. Raises the first failure after the writes of its stage."""
+        files, self._files = self._files, []
+        images, self._images = self._images, []
+        statuses, self._statuses = self._statuses, []
+        self._send(self._md_api.put, files)
+        self._send(self._md_api.put_img, images)
+        if self._bulk and len(statuses) > 1:
+            self._md_api.post('upload-metadata', statuses)
+        else:
+            self._send(self._md_api.post, [('upload-metadata', row) for row in statuses])
+
+    def _send(self, fun, args: list) -> None:
+        if len(args) <= 1:
+            for arg in args:
+                fun(*arg)
+            return
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(args))) as executor:
+            futures = [executor.submit(fun, *arg) for arg in args]
+        for future in futures:
+            future.result()
+
+
+class MetadataIndex:
+    """In-memory index of the file and upload metadata of one site over a date range.
+
+    Both metadata types are fetched with a single request covering the whole date range
+    the first time they are needed, and indexed by (date, product / instrument / model).
+    File metadata of a date is fetched again only after it has been invalidated.
+
+    Args:
+        md_api (MetadataApi): Metadata API instance used for fetching.
+        site (str): Site id.
+        date_from (str): First date as "YYYY-MM-DD".
+        date_to (str): Last date (included) as "YYYY-MM-DD".
+
+    """
+
+    def __init__(self, md_api: MetadataApi, site: str, date_from: str, date_to: str):
+        self._md_api = md_api
+        self._site = site
+        self._date_from = date_from
+        self._date_to = date_to
+        self._files = None
+        self._uploads = None
+        self._stale_dates = set()
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def get_files(self, date_str: str, product: str, model: str = None,
+                  show_legacy: bool = False) -> list:
+        """Return file metadata of a product, optimum model first for model files."""
+        with self._lock:
+            self._update_files(date_str)
+            metadata = self._files.get((date_str, product), [])
+        if not show_legacy:
+            metadata = [row for row in metadata if not row.get('legacy', False)]
+        if model:
+            metadata = [row for row in metadata if _get_model_id(row) == model]
+        elif product == 'model':
+            metadata = sorted(metadata, key=_get_optimum_order)
+        return metadata
+
+    def get_uploads(self, date_str: str, instrument: str = None, model: str = None) -> list:
+        """Return upload metadata of an instrument or model."""
+        with self._lock:
+            self._update_uploads()
+            metadata = self._uploads.get((date_str, instrument or model), [])
+        return self._md_api.screen_metadata(metadata, instrument=instrument, model=model)
+
+    def get_all_uploads(self) -> list:
+        """Return upload metadata of the whole date range."""
+        with self._lock:
+            self._update_uploads()
+            return [row for rows in self._uploads.values() for row in rows]
+
+    def prefetch(self) -> None:
+        """Fetch file and upload metadata of the whole date range now."""
+        with self._lock:
+            self._update_files(self._date_from)
+            self._update_uploads()
+
+    def for_date(self, date_str: str) -> 'MetadataIndex':
+        """Return index of one date, holding the metadata of the date fetched so far."""
+        index = MetadataIndex(self._md_api, self._site, date_str, date_str)
+        with self._lock:
+            if self._files is not None and date_str not in self._stale_dates:
+                index._files = _select_date(self._files, date_str)
+            if self._uploads is not None:
+                index._uploads = _select_date(self._uploads, date_str)
+        return index
+
+    def for_site(self, site: str) -> 'MetadataIndex':
+        """Return empty index of another site over the same date range."""
+        return MetadataIndex(self._md_api, site, self._date_from, self._date_to)
+
+    def invalidate_files(self, date_str: str) -> None:
+        """Mark file metadata of a date outdated, e.g., after a product upload."""
+        with self._lock:
+            self._stale_dates.add(date_str)
+
+    def set_upload_status(self, uuids: list, status: str) -> None:
+        """Update status of uploads to match a change made in the metadata server."""
+        with self._lock:
+            self._update_uploads()
+            for rows in self._uploads.values():
+                for row in rows:
+                    if row['uuid'] in uuids:
+                        row['status'] = status
+
+    def _update_files(self, date_str: str) -> None:
+        if self._files is None:
+            self._files = self._fetch('api/files', self._date_from, self._date_to,
+                                      _get_product_key)
+        elif date_str in self._stale_dates:
+            self._files = {key: rows for key, rows in self._files.items() if key[0] != date_str}
+            files = self._fetch('api/files', date_str, date_str, _get_product_key)
+            self._files.update({key: rows for key, rows in files.items() if key[0] == date_str})
+            self._stale_dates.remove(date_str)
+
+    def _update_uploads(self) -> None:
+        if self._uploads is None:
+            self._uploads = self._fetch('upload-metadata', self._date_from, self._date_to,
+                                        _get_source_key)
+
+    def _fetch(self, end_point: str, date_from: str, date_to: str, get_key) -> dict:
+        payload = {
+            'dateFrom': date_from,
+            'dateTo': date_to,
+            'site': self._site,
+            'developer': True
+        }
+        if end_point == 'api/files':
+            payload['showLegacy'] = True
+            payload['allModels'] = True
+        index = defaultdict(list)
+        for row in self._md_api.get(end_point, payload):
+            index[get_key(row)].append(row)
+        return dict(index)
+
+
+def _select_date(index: dict, date_str: str) -> dict:
+    return {key: rows for key, rows in index.items() if key[0] == date_str}
+
+
+def _get_product_key(row: dict) -> tuple:
+    return row['measurementDate'], row['product']['id']
+
+
+def _get_source_key(row: dict) -> tuple:
+    source = row['instrument'] or row['model']
+    return row['measurementDate'], source['id']
+
+
+def _get_model_id(row: dict) -> str:
+    if row.get('model'):
+        return row['model']['id']
+    return utils.get_model_identifier(row['filename'])
+
+
+def _get_optimum_order(row: dict) -> int:
+    if row.get('model'):
+        return int(row['model'].get('optimumOrder', 0))
+    return 0
@@ -3,9 +3,14 @@ import shutil
 from tempfile import NamedTemporaryFile
 import netCDF4
 from cloudnetpy.utils import get_uuid, get_time
+from data_processing.compression import Profile
 
+BLOCK_BYTES = 64 * 1024**2
+MODEL_FILE_FORMATS = ('NETCDF4_CLASSIC',)
 
-def fix_legacy_file(legacy_file_full_path: str, target_full_path: str) -> str:
+
+def fix_legacy_file(legacy_file_full_path: str, target_full_path: str,
+                    profile: Profile = None) -> str:
     """Fix legacy netCDF file."""
 
     uuid = get_uuid()
@@ -13,7 +18,7 @@ def fix_legacy_file(legacy_file_full_path: str, target_full_path: str) -> str:
     nc_legacy = netCDF4.Dataset(legacy_file_full_path, 'r')
     nc_new = netCDF4.Dataset(target_full_path, 'w', format='NETCDF4_CLASSIC')
 
-    copy_file_contents(nc_legacy, nc_new)
+    copy_file_contents(nc_legacy, nc_new, profile=profile)
     history = _get_history(nc_legacy)
 
     nc_new.file_uuid = uuid
@@ -55,20 +60,46 @@ def fix_mwr_file(full_path: str,
 
 def fix_model_file(full_path: str,
                    site_name: str,
-                   uuid: Union[str, bool, None]) -> str:
-    """Fixes global attributes of raw model netCDF file."""
-
-    def _get_date():
-        date_string = nc.variables['time'].units
-        the_date = date_string.split()[2]
-        return the_date.split('-')
+                   uuid: Union[str, bool, None],
+                   profile: Profile = None) -> str:
+    """Fixes global attributes of raw model netCDF file.
+
+    Files already in an accepted format are edited in place. Other files are converted
+    to NETCDF4_CLASSIC.
+    """
+    with netCDF4.Dataset(full_path, 'r') as nc:
+        is_accepted_format = nc.data_model in MODEL_FILE_FORMATS
+
+    if is_accepted_format:
+        nc = netCDF4.Dataset(full_path, 'a')
+        uuid = _fix_model_attributes(nc, site_name, uuid)
+        nc.close()
+        return uuid
 
     temp_file = NamedTemporaryFile()
 
     nc_raw = netCDF4.Dataset(full_path, 'r')
     nc = netCDF4.Dataset(temp_file.name, 'w', format='NETCDF4_CLASSIC')
 
-    copy_file_contents(nc_raw, nc)
+    copy_file_contents(nc_raw, nc, profile=profile)
+    uuid = _fix_model_attributes(nc, site_name, uuid)
+
+    nc.close()
+    nc_raw.close()
+
+    shutil.copy(temp_file.name, full_path)
+
+    return uuid
+
+
+def _fix_model_attributes(nc: netCDF4.Dataset,
+                          site_name: str,
+                          uuid: Union[str, bool, None]) -> str:
+
+    def _get_date():
+        date_string = nc.variables['time'].units
+        the_date = date_string.split()[2]
+        return the_date.split('-')
 
     uuid = uuid or get_uuid()
     nc.file_uuid = uuid
@@ -78,30 +109,73 @@ def fix_model_file(full_path: str,
     nc.title = _get_title(nc)
     nc.location = site_name
     nc.Conventions = 'CF-1.7'
+    return uuid
 
-    nc.close()
-    nc_raw.close()
 
-    shutil.copy(temp_file.name, full_path)
+def copy_file_contents(source: netCDF4.Dataset, target: netCDF4.Dataset,
+                       block_bytes: int = BLOCK_BYTES, profile: Profile = None) -> None:
+    """Copies dimensions, variables and global attributes from source to target.
 
-    return uuid
+    Variables are copied as stored (without masking or scaling) in blocks along their first
+    dimension, so that memory use does not depend on the file size. Chunking and
+    compression level of the source variables are kept where possible, unless a
+    compression profile is given.
 
+    Args:
+        source (netCDF4.Dataset): Source dataset.
+        target (netCDF4.Dataset): Target dataset.
+        block_bytes (int, optional): Maximum size of a copied block in bytes.
+        profile (Profile, optional): Compression profile of the target variables.
 
-def copy_file_contents(source: netCDF4.Dataset, target: netCDF4.Dataset) -> None:
+    """
+    source.set_auto_maskandscale(False)
     for key, dimension in source.dimensions.items():
         target.createDimension(key, dimension.size)
     for var_name, variable in source.variables.items():
-        var_out = target.createVariable(var_name, variable.datatype, variable.dimensions,
-                                        zlib=True)
         attr = {k: variable.getncattr(k) for k in variable.ncattrs()}
-        if '_FillValue' in attr:
-            del attr['_FillValue']
+        fill_value = attr.pop('_FillValue', None)
+        if profile is None:
+            options = _get_storage_options(variable, target)
+        else:
+            options = profile.get_options(target, variable.dimensions, variable.dtype.itemsize)
+        var_out = target.createVariable(var_name, variable.datatype, variable.dimensions,
+                                        fill_value=fill_value, **options)
+        if profile is not None:
+            profile.set_chunk_cache(var_out)
+        var_out.set_auto_maskandscale(False)
         var_out.setncatts(attr)
-        var_out[:] = variable[:]
+        _copy_blocks(variable, var_out, block_bytes)
     for attr_name in source.ncattrs():
         setattr(target, attr_name, source.getncattr(attr_name))
 
 
+def _get_storage_options(variable: netCDF4.Variable, target: netCDF4.Dataset) -> dict:
+    """Returns compression and chunking of a source variable usable in the target file."""
+    options = {'zlib': True}
+    filters = variable.filters() or {}
+    if filters.get('zlib'):
+        options['complevel'] = filters['complevel']
+        options['shuffle'] = filters['shuffle']
+    chunks = variable.chunking()
+    if isinstance(chunks, list):
+        dim_sizes = [target.dimensions[dim].size for dim in variable.dimensions]
+        if all(0 < chunk <= max(size, 1) for chunk, size in zip(chunks, dim_sizes)):
+            options['chunksizes'] = chunks
+    return options
+
+
+def _copy_blocks(source: netCDF4.Variable, target: netCDF4.Variable, block_bytes: int) -> None:
+    if source.ndim == 0 or source.shape[0] == 0:
+        target[:] = source[:]
+        return
+    row_bytes = source.dtype.itemsize
+    for size in source.shape[1:]:
+        row_bytes *= size
+    block_size = max(1, block_bytes // max(1, row_bytes))
+    for start in range(0, source.shape[0], block_size):
+        target[start:start + block_size] = source[start:start + block_size]
+
+
 def _get_history(nc: netCDF4.Dataset) -> str:
     old_history = getattr(nc, 'history', '')
     new_record = f"{get_time()} - File content harmonized by the CLU unit.\n"
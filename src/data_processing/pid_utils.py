@@ -2,22 +2,25 @@ from typing import Tuple
 import netCDF4
 import requests
 from requests import HTTPError
+from data_processing import transport
+from data_processing.utils import NC_LOCK
 
 
 class PidUtils:
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, session: requests.Session = None):
         self._pid_service_url = config['PID-SERVICE']['url']
+        self.session = session or transport.create_session(config)
 
     def add_pid_to_file(self, filepath: str) -> Tuple[str, str]:
         """Queries PID service and adds the PID to NC file metadata."""
-        rootgrp = netCDF4.Dataset(filepath, 'r+')
-        uuid = getattr(rootgrp, 'file_uuid')
+        with NC_LOCK, netCDF4.Dataset(filepath, 'r') as rootgrp:
+            uuid = getattr(rootgrp, 'file_uuid')
         payload = {
             'type': 'file',
             'uuid': uuid
         }
-        res = requests.post(self._pid_service_url, json=payload)
+        res = self.session.post(self._pid_service_url, json=payload)
 
         try:
             res.raise_for_status()
@@ -25,7 +28,7 @@ class PidUtils:
             raise HTTPError(f'PID service failed with status {res.status_code}:\n{res.json()["detail"]}')
 
         pid = res.json()['pid']
-        rootgrp.pid = pid
-        rootgrp.close()
+        with NC_LOCK, netCDF4.Dataset(filepath, 'r+') as rootgrp:
+            rootgrp.pid = pid
 
         return uuid, pid
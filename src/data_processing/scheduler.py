@@ -0,0 +1,133 @@
+"""Module for running Cloudnet processing steps in dependency order."""
+import io
+import sys
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Union
+from requests.exceptions import RequestException
+from data_processing.utils import MiscError, RawDataMissingError, ChecksumError
+
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+# Errors failing a task. Other errors are raised by Scheduler.run.
+TASK_ERRORS = (RawDataMissingError, MiscError, ChecksumError, RequestException, ValueError,
+               RuntimeError)
+
+
+class Scheduler:
+    """Runs tasks of a dependency graph, each task as soon as its dependencies are done.
+
+    Tasks whose dependencies are all finished are executed concurrently in a thread pool.
+    A task fails by raising one of TASK_ERRORS or returning False, in which case every task
+    depending on it (directly or indirectly) is skipped without being executed. Any other
+    exception is raised after the running tasks have finished. Anything a task prints is
+    collected and written out as one block when the task finishes.
+
+    Args:
+        max_workers (int, optional): Maximum number of concurrently running tasks.
+            Default is the number of tasks.
+
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self._tasks = {}
+        self._dependencies = {}
+
+    def add(self, name: str, fun: Callable, dependencies: Iterable[str] = ()) -> None:
+        """Adds a task. Dependencies not added to the scheduler are ignored."""
+        self._tasks[name] = fun
+        self._dependencies[name] = list(dependencies)
+
+    def run(self, on_skip: Callable = None) -> dict:
+        """Runs all tasks.
+
+        Args:
+            on_skip (function, optional): Called with the names of the skipped task and its
+                failed dependency. Its return value is printed in place of the task output.
+
+        Returns:
+            dict: Final status (DONE, FAILED or SKIPPED) of each task.
+
+        """
+        dependencies = {name: [dep for dep in deps if dep in self._tasks]
+                        for name, deps in self._dependencies.items()}
+        _check_cycles(dependencies)
+        status = {}
+        output = _ThreadOutput(sys.stdout)
+        max_workers = self.max_workers or len(self._tasks) or 1
+        with redirect_stdout(output), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while len(status) < len(self._tasks):
+                for name in self._tasks:
+                    if name in status or name in running.values():
+                        continue
+                    failed = _find_failed_dependency(name, dependencies, status)
+                    if failed:
+                        status[name] = SKIPPED
+                        text = on_skip(name, failed) if on_skip else ''
+                        output.default.write(f'{text}\n' if text else '')
+                    elif all(status.get(dep) == DONE for dep in dependencies[name]):
+                        future = executor.submit(output.capture, self._tasks[name])
+                        running[future] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    is_success, text = future.result()
+                    status[name] = DONE if is_success else FAILED
+                    output.default.write(text)
+        return status
+
+
+def _find_failed_dependency(name: str, dependencies: dict, status: dict) -> Union[str, None]:
+    for dep in dependencies[name]:
+        if status.get(dep) in (FAILED, SKIPPED):
+            return dep
+    return None
+
+
+def _check_cycles(dependencies: dict) -> None:
+    visited = set()
+
+    def _visit(name: str, path: tuple) -> None:
+        if name in path:
+            raise ValueError(f'Circular dependency: {" -> ".join(path + (name,))}')
+        if name in visited:
+            return
+        for dep in dependencies[name]:
+            _visit(dep, path + (name,))
+        visited.add(name)
+
+    for task in dependencies:
+        _visit(task, ())
+
+
+class _ThreadOutput(io.TextIOBase):
+    """Stream that keeps output written by each task thread separate."""
+
+    def __init__(self, default):
+        super().__init__()
+        self.default = default
+        self._local = threading.local()
+
+    def capture(self, fun: Callable) -> tuple:
+        self._local.buffer = io.StringIO()
+        try:
+            is_success = fun() is not False
+        except TASK_ERRORS as err:
+            print(err)
+            is_success = False
+        finally:
+            text = self._local.buffer.getvalue()
+            del self._local.buffer
+        return is_success, text
+
+    def write(self, text: str) -> int:
+        return getattr(self._local, 'buffer', self.default).write(text)
+
+    def flush(self) -> None:
+        getattr(self._local, 'buffer', self.default).flush()
@@ -1,47 +1,89 @@
 """Metadata API for Cloudnet files."""
+import os
+import time
+import hashlib
+import threading
+import multiprocessing
+from multiprocessing.pool import Pool
 from os import path
 from typing import Union
-from tempfile import NamedTemporaryFile
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.exceptions import RequestException
+import matplotlib.pyplot as plt
 from cloudnetpy.plotting import generate_figure, generate_legacy_figure
-from data_processing import utils
+from data_processing import utils, transport
+from data_processing.file_cache import create_file_cache
+from data_processing.utils import ChecksumError
+
+CHUNK_SIZE = 1024 * 1024
+MAX_TRANSFERS = 8
+PLOT_TASKS_PER_WORKER = 20
+# Modules to preload in the forkserver process (see workers.set_preload)
+PRELOAD = ['data_processing.storage_api']
 
 
 class StorageApi:
     """Class for uploading / downloading files from the Cloudnet S3 data archive in Sodankylä."""
 
-    def __init__(self, config: dict, session=requests.Session()):
-        self.session = session
+    def __init__(self, config: dict, session: requests.Session = None,
+                 plot_workers: int = None):
+        self.session = session = session or transport.create_session(config)
         self._url = config['STORAGE-SERVICE']['url']
         self._auth = (config['STORAGE-SERVICE']['username'],
                       config['STORAGE-SERVICE']['password'])
+        max_transfers = int(config['STORAGE-SERVICE'].get('max_transfers', MAX_TRANSFERS))
+        self.transfer_manager = TransferManager(session, self._auth, max_transfers)
+        self.file_cache = create_file_cache(config)
+        self._plot_workers = int(config['STORAGE-SERVICE'].get(
+            'plot_workers', plot_workers or os.cpu_count() or 1))
+        self._plot_pool = None
+        self._plot_pool_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_plot_pool'] = None
+        del state['_plot_pool_lock']
+        return state
 
-    def upload_product(self, full_path: str, s3key: str) -> dict:
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._plot_pool_lock = threading.Lock()
+
+    def upload_product(self, full_path: str, s3key: str,
+                       facts: utils.ProductFacts = None) -> dict:
         """Upload a processed Cloudnet file."""
-        volatile = utils.is_volatile_file(full_path)
-        bucket = utils.get_product_bucket(volatile)
-        headers = self._get_headers(full_path)
+        facts = facts or utils.ProductFacts(full_path)
+        bucket = utils.get_product_bucket(facts.volatile)
+        headers = {'content-md5': facts.content_md5}
         url = path.join(self._url, bucket, s3key)
         res = self._put(url, full_path, headers).json()
+        if self.file_cache is not None:
+            self.file_cache.put(facts.checksum, full_path)
         return {'version': res.get('version', ''),
                 'size': int(res['size'])}
 
     def download_raw_files(self, metadata: list, dir_name: str) -> list:
         """Download raw files."""
-        urls = [path.join(self._url, 'cloudnet-upload', row['s3key']) for row in metadata]
-        full_paths = [path.join(dir_name, row['filename']) for row in metadata]
-        for args in zip(urls, full_paths):
-            self._get(*args)
-        return full_paths
+        transfers = [Transfer('GET',
+                              path.join(self._url, 'cloudnet-upload', row['s3key']),
+                              path.join(dir_name, row['filename']),
+                              checksum=row.get('checksum'),
+                              hash_method='md5')
+                     for row in metadata]
+        self._download(transfers)
+        return [transfer.full_path for transfer in transfers]
 
     def download_product(self, metadata: dict, dir_name: str) -> str:
         """Download a product."""
-        s3key = metadata['filename']
-        bucket = utils.get_product_bucket(metadata['volatile'])
-        url = path.join(self._url, bucket, s3key)
-        full_path = path.join(dir_name, s3key)
-        self._get(url, full_path)
-        return full_path
+        return self.download_products([metadata], dir_name)[0]
+
+    def download_products(self, metadata: list, dir_name: str) -> list:
+        """Download several products concurrently."""
+        transfers = [self._get_product_transfer(row, dir_name) for row in metadata]
+        self._download(transfers)
+        return [transfer.full_path for transfer in transfers]
 
     def delete_volatile_product(self, s3key: str) -> requests.Response:
         """Delete a volatile product."""
@@ -57,48 +99,214 @@ class StorageApi:
                                  product: str,
                                  legacy: bool = False) -> list:
         """Create and upload images."""
-        temp_file = NamedTemporaryFile(suffix='.png')
         try:
             fields, max_alt = utils.get_fields_for_plot(product)
         except NotImplementedError:
             print(f'Warning: plotting for {product} not implemented', end='\t')
             return []
-        visualizations = []
+        temp_dir = TemporaryDirectory()
+        pool = self._get_plot_pool()
+        renders = []
         for field in fields:
-            try:
-                if legacy:
-                    generate_legacy_figure(nc_file_full_path, product, field,
-                                           image_name=temp_file.name, max_y=max_alt, dpi=120)
-                else:
-                    generate_figure(nc_file_full_path, [field], show=False,
-                                    image_name=temp_file.name, max_y=max_alt, sub_title=False,
-                                    title=False, dpi=120)
-            except (IndexError, ValueError, TypeError):
-                continue
-            s3key = product_key.replace('.nc', f"-{uuid[:8]}-{field}.png")
-            url = path.join(self._url, 'cloudnet-img', s3key)
-            headers = self._get_headers(temp_file.name)
-            self._put(url, temp_file.name, headers=headers)
-            visualizations.append({
-                's3key': s3key,
-                'variable_id': utils.get_var_id(product, field),
-            })
+            image_name = path.join(temp_dir.name, f'{field}.png')
+            args = (nc_file_full_path, product, field, image_name, max_alt, legacy)
+            renders.append((field, image_name, pool.apply_async(_render_figure, args)))
+        visualizations = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.transfer_manager.max_workers) as uploader:
+                uploads = []
+                for field, image_name, render in renders:
+                    if not render.get():
+                        continue
+                    s3key = product_key.replace('.nc', f"-{uuid[:8]}-{field}.png")
+                    url = path.join(self._url, 'cloudnet-img', s3key)
+                    transfer = Transfer('PUT', url, image_name,
+                                        headers=self._get_headers(image_name))
+                    uploads.append(uploader.submit(self.transfer_manager.run, [transfer]))
+                    visualizations.append({
+                        's3key': s3key,
+                        'variable_id': utils.get_var_id(product, field),
+                    })
+                for upload in uploads:
+                    upload.result()
+        finally:
+            for _, _, render in renders:
+                render.wait()
+            temp_dir.cleanup()
         return visualizations
 
+    def close(self) -> None:
+        """Stops the plotting processes."""
+        with self._plot_pool_lock:
+            if self._plot_pool is not None:
+                self._plot_pool.terminate()
+                self._plot_pool.join()
+                self._plot_pool = None
+
+    def _get_plot_pool(self) -> Pool:
+        """Returns pool of plotting processes, recycled after a number of figures."""
+        with self._plot_pool_lock:
+            if self._plot_pool is None:
+                context = multiprocessing.get_context('forkserver')
+                self._plot_pool = context.Pool(self._plot_workers,
+                                               maxtasksperchild=PLOT_TASKS_PER_WORKER)
+            return self._plot_pool
+
+    def _download(self, transfers: list) -> None:
+        """Downloads files, using the local file cache when possible."""
+        if self.file_cache is None:
+            self.transfer_manager.run(transfers)
+            return
+        transfers = [transfer for transfer in transfers if not transfer.checksum
+                     or not self.file_cache.get(transfer.checksum, transfer.full_path,
+                                                transfer.hash_method)]
+        self.transfer_manager.run(transfers)
+        for transfer in transfers:
+            if transfer.checksum:
+                self.file_cache.put(transfer.checksum, transfer.full_path)
+
+    def _get_product_transfer(self, metadata: dict, dir_name: str) -> 'Transfer':
+        s3key = metadata['filename']
+        bucket = utils.get_product_bucket(metadata['volatile'])
+        return Transfer('GET',
+                        path.join(self._url, bucket, s3key),
+                        path.join(dir_name, s3key),
+                        checksum=metadata.get('checksum'),
+                        hash_method='sha256')
+
     def _put(self, url: str, full_path: str,
              headers: Union[dict, None] = None) -> requests.Response:
-        res = self.session.put(url, data=open(full_path, 'rb'), auth=self._auth, headers=headers)
-        res.raise_for_status()
-        return res
-
-    def _get(self, url: str, full_path: str) -> requests.Response:
-        res = self.session.get(url, auth=self._auth)
-        res.raise_for_status()
-        with open(full_path, 'wb') as f:
-            f.write(res.content)
-        return res
+        transfer = Transfer('PUT', url, full_path, headers=headers)
+        self.transfer_manager.run([transfer])
+        return transfer.response
 
     @staticmethod
     def _get_headers(full_path: str) -> dict:
         checksum = utils.md5sum(full_path, is_base64=True)
         return {'content-md5': checksum}
+
+
+def _render_figure(nc_file_full_path: str, product: str, field: str, image_name: str,
+                   max_alt: float, legacy: bool) -> bool:
+    """Renders a quicklook in a plotting process. Returns False if field is not plottable."""
+    try:
+        if legacy:
+            generate_legacy_figure(nc_file_full_path, product, field,
+                                   image_name=image_name, max_y=max_alt, dpi=120)
+        else:
+            generate_figure(nc_file_full_path, [field], show=False,
+                            image_name=image_name, max_y=max_alt,
+                            sub_title=False, title=False, dpi=120)
+    except (IndexError, ValueError, TypeError):
+        return False
+    finally:
+        plt.close('all')
+    return True
+
+
+class Transfer:
+    """Single GET or PUT transfer of a file and its outcome.
+
+    Args:
+        method (str): 'GET' (download to `full_path`) or 'PUT' (upload from `full_path`).
+        url (str): Storage service url of the file.
+        full_path (str): Local path of the file.
+        headers (dict, optional): Extra request headers.
+        checksum (str, optional): Expected checksum of a downloaded file.
+        hash_method (str, optional): Hash function of the checksum. Default is 'md5'.
+
+    """
+
+    __slots__ = ['method', 'url', 'full_path', 'headers', 'checksum', 'hash_method',
+                 'bytes_transferred', 'elapsed', 'response', 'error']
+
+    def __init__(self, method: str, url: str, full_path: str, headers: dict = None,
+                 checksum: str = None, hash_method: str = 'md5'):
+        self.method = method
+        self.url = url
+        self.full_path = full_path
+        self.headers = headers
+        self.checksum = checksum
+        self.hash_method = hash_method
+        self.bytes_transferred = 0
+        self.elapsed = 0.0
+        self.response = None
+        self.error = None
+
+
+class TransferManager:
+    """Runs file transfers concurrently over one session.
+
+    Transfers are executed in a bounded thread pool so that their latencies overlap
+    while connections are reused from the connection pool of the session. Progress
+    (bytes transferred, elapsed time) and errors are stored in each `Transfer`.
+
+    Args:
+        session (Session): Session used for requests.
+        auth (tuple): Credentials of the storage service.
+        max_workers (int, optional): Maximum number of concurrent transfers.
+
+    """
+
+    def __init__(self, session, auth: tuple, max_workers: int = MAX_TRANSFERS):
+        self.session = session
+        self.max_workers = max_workers
+        self._auth = auth
+
+    def run(self, transfers: list) -> list:
+        """Executes transfers and waits for all of them to finish.
+
+        Returns:
+            list: The transfers.
+
+        Raises:
+            The error of the first failed transfer, after all transfers have finished.
+
+        """
+        if len(transfers) == 1 or self.max_workers <= 1:
+            for transfer in transfers:
+                self._execute(transfer)
+        elif transfers:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(transfers))) as pool:
+                list(pool.map(self._execute, transfers))
+        for transfer in transfers:
+            if transfer.error is not None:
+                raise transfer.error
+        return transfers
+
+    def _execute(self, transfer: Transfer) -> None:
+        start = time.time()
+        try:
+            if transfer.method == 'GET':
+                self._get(transfer)
+            else:
+                self._put(transfer)
+        except (RequestException, ChecksumError, OSError) as err:
+            transfer.error = err
+        finally:
+            transfer.elapsed = time.time() - start
+
+    def _put(self, transfer: Transfer) -> None:
+        with open(transfer.full_path, 'rb') as data:
+            res = self.session.put(transfer.url, data=data, auth=self._auth,
+                                   headers=transfer.headers)
+        res.raise_for_status()
+        transfer.bytes_transferred = path.getsize(transfer.full_path)
+        transfer.response = res
+
+    def _get(self, transfer: Transfer) -> None:
+        """Streams file to disk, verifying its checksum (if given) on the way."""
+        hash_sum = getattr(hashlib, transfer.hash_method)()
+        with self.session.get(transfer.url, auth=self._auth, stream=True,
+                              headers=transfer.headers) as res:
+            res.raise_for_status()
+            with open(transfer.full_path, 'wb') as f:
+                for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    hash_sum.update(chunk)
+                    transfer.bytes_transferred += len(chunk)
+        transfer.response = res
+        if transfer.checksum and hash_sum.hexdigest() != transfer.checksum:
+            os.remove(transfer.full_path)
+            raise ChecksumError(f'Checksum mismatch in downloaded file '
+                                f'{path.basename(transfer.full_path)}')
@@ -0,0 +1,173 @@
+"""HTTP transport shared by the Cloudnet API clients."""
+import time
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.exceptions import ConnectionError, Timeout
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_SIZE = 16
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'DELETE'])
+MAX_FAILURES = 5
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request to a service that is considered down."""
+
+
+class CircuitBreaker:
+    """Tracks consecutive transport failures (connection errors, timeouts) of one service.
+
+    After `max_failures` consecutive failures the circuit opens and requests to the service
+    are refused without sending them. If `reset_timeout` is given, one probe request is let
+    through once the circuit has been open that long (half-open state): success closes the
+    circuit, failure opens it again.
+
+    Args:
+        service (str): Service address, used in messages.
+        max_failures (int): Number of consecutive failures opening the circuit.
+        reset_timeout (float, optional): Seconds before probing an open circuit.
+            Default is to keep the circuit open.
+
+    """
+
+    def __init__(self, service: str, max_failures: int = MAX_FAILURES,
+                 reset_timeout: float = None):
+        self.service = service
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.refused = 0
+        self._opened_at = None
+        self._is_probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    @property
+    def can_recover(self) -> bool:
+        return self.reset_timeout is not None
+
+    def before_request(self) -> None:
+        """Raises CircuitOpenError if the request should not be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (self.can_recover and not self._is_probing
+                    and time.time() - self._opened_at >= self.reset_timeout):
+                self._is_probing = True
+                return
+            self.refused += 1
+        raise CircuitOpenError(f'{self.service} unreachable after {self.failures} '
+                               f'consecutive failures, request not sent')
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._is_probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._is_probing or self.failures >= self.max_failures:
+                self._opened_at = time.time()
+                self._is_probing = False
+
+    def get_summary(self) -> str:
+        return (f'{self.service} unreachable ({self.failures} consecutive failures, '
+                f'{self.refused} requests not sent)')
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter applying a default timeout to requests sent without one, and
+    a circuit breaker to each service (scheme and host) it sends requests to."""
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['timeout', 'max_failures', 'reset_timeout']
+
+    def __init__(self, timeout: tuple, max_failures: int = MAX_FAILURES,
+                 reset_timeout: float = None, **kwargs):
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self._breaker_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.breakers = {}
+        self._breaker_lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        breaker = self._get_breaker(request.url)
+        breaker.before_request()
+        try:
+            res = super().send(request, **kwargs)
+        except (ConnectionError, Timeout):
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return res
+
+    def _get_breaker(self, url: str) -> CircuitBreaker:
+        parts = urlsplit(url)
+        service = f'{parts.scheme}://{parts.netloc}'
+        with self._breaker_lock:
+            if service not in self.breakers:
+                self.breakers[service] = CircuitBreaker(service, self.max_failures,
+                                                        self.reset_timeout)
+            return self.breakers[service]
+
+
+def create_session(config: dict) -> requests.Session:
+    """Creates session with a pool of keep-alive connections, timeouts and retries.
+
+    Settings are read from the (optional) HTTP section of the main config. Only requests
+    without body (GET, HEAD, OPTIONS, DELETE) are retried, with exponential backoff,
+    after connection errors and 502 / 503 / 504 responses. Requests to a service are
+    refused after `max_failures` consecutive transport failures (see CircuitBreaker).
+
+    Args:
+        config (dict): Main config.
+
+    Returns:
+        Session: Session to be shared by all API clients.
+
+    """
+    http_config = config['HTTP'] if 'HTTP' in config else {}
+    pool_size = int(http_config.get('pool_size', POOL_SIZE))
+    timeout = (float(http_config.get('connect_timeout', CONNECT_TIMEOUT)),
+               float(http_config.get('read_timeout', READ_TIMEOUT)))
+    retry = Retry(total=int(http_config.get('retries', RETRIES)),
+                  backoff_factor=float(http_config.get('backoff_factor', BACKOFF_FACTOR)),
+                  status_forcelist=(502, 503, 504),
+                  allowed_methods=IDEMPOTENT_METHODS,
+                  raise_on_status=False)
+    reset_timeout = http_config.get('reset_timeout')
+    adapter = TimeoutHTTPAdapter(timeout,
+                                 max_failures=int(http_config.get('max_failures', MAX_FAILURES)),
+                                 reset_timeout=float(reset_timeout) if reset_timeout else None,
+                                 pool_connections=pool_size,
+                                 pool_maxsize=pool_size,
+                                 max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_open_circuits(session: requests.Session) -> list:
+    """Returns circuit breakers of the session that are currently open."""
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    return [breaker for adapter in adapters.values()
+            for breaker in getattr(adapter, 'breakers', {}).values() if breaker.is_open]
@@ -1,44 +1,92 @@
+import os
 import datetime
 import configparser
 import hashlib
-import requests
+import threading
 from typing import Tuple, Union
 from cloudnetpy.utils import get_time
 from cloudnetpy.plotting.plot_meta import ATTRIBUTES as ATTR
 import base64
 import netCDF4
 
+# netCDF4 (HDF5) is not thread-safe. Threads reading or editing files in the main process
+# must hold this lock. Processing steps run in worker processes (see workers.WorkerPool).
+NC_LOCK = threading.RLock()
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+MAX_CACHED_DIGESTS = 1024
+_DIGEST_CACHE = {}
+_DIGEST_LOCK = threading.Lock()
+
 
 def create_product_put_payload(full_path: str,
                                storage_service_response: dict,
                                product: str = None,
                                site: str = None,
                                date_str: str = None,
-                               model: str = None) -> dict:
-    nc = netCDF4.Dataset(full_path, 'r')
-
+                               model: str = None,
+                               facts: 'ProductFacts' = None) -> dict:
+    facts = facts or ProductFacts(full_path)
     payload = {
-        'product': product or nc.cloudnet_file_type,
-        'site': site or nc.location.lower(),
-        'measurementDate': date_str or f'{nc.year}-{nc.month}-{nc.day}',
-        'format': get_file_format(nc),
-        'checksum': sha256sum(full_path),
-        'volatile': not hasattr(nc, 'pid'),
-        'uuid': getattr(nc, 'file_uuid', ''),
-        'pid': getattr(nc, 'pid', ''),
-        'history': getattr(nc, 'history', ''),
-        'cloudnetpyVersion': getattr(nc, 'cloudnetpy_version', ''),
+        'product': product or facts.product,
+        'site': site or facts.site,
+        'measurementDate': date_str or facts.date_str,
+        'format': facts.format,
+        'checksum': facts.checksum,
+        'volatile': facts.volatile,
+        'uuid': facts.uuid,
+        'pid': facts.pid,
+        'history': facts.history,
+        'cloudnetpyVersion': facts.cloudnetpy_version,
         ** storage_service_response
     }
-    source_uuids = getattr(nc, 'source_file_uuids', None)
-    if source_uuids:
-        payload['sourceFileIds'] = source_uuids.replace(' ', '').split(',')
+    if facts.source_uuids:
+        payload['sourceFileIds'] = facts.source_uuids
     if model:
         payload['model'] = model
-    nc.close()
     return payload
 
 
+class ProductFacts:
+    """Metadata and checksums of a product file, read from the file once.
+
+    Build the facts after the last modification of the file (e.g. adding the PID)
+    and pass them on instead of reopening the file.
+
+    Args:
+        full_path (str): Path of the netCDF file.
+
+    """
+
+    __slots__ = ['full_path', 'product', 'site', 'date_str', 'format', 'volatile', 'uuid',
+                 'pid', 'history', 'cloudnetpy_version', 'source_uuids', 'checksum',
+                 'content_md5']
+
+    def __init__(self, full_path: str):
+        self.full_path = full_path
+        with NC_LOCK:
+            nc = netCDF4.Dataset(full_path, 'r')
+            try:
+                self.product = getattr(nc, 'cloudnet_file_type', None)
+                location = getattr(nc, 'location', None)
+                self.site = location.lower() if location else None
+                self.date_str = (f'{nc.year}-{nc.month}-{nc.day}'
+                                 if all(hasattr(nc, key) for key in ('year', 'month', 'day'))
+                                 else None)
+                self.format = get_file_format(nc)
+                self.volatile = not hasattr(nc, 'pid')
+                self.uuid = getattr(nc, 'file_uuid', '')
+                self.pid = getattr(nc, 'pid', '')
+                self.history = getattr(nc, 'history', '')
+                self.cloudnetpy_version = getattr(nc, 'cloudnetpy_version', '')
+                source_uuids = getattr(nc, 'source_file_uuids', None)
+            finally:
+                nc.close()
+        self.source_uuids = source_uuids.replace(' ', '').split(',') if source_uuids else []
+        self.checksum = sha256sum(full_path)
+        self.content_md5 = md5sum(full_path, is_base64=True)
+
+
 def get_file_format(nc: netCDF4.Dataset):
     file_format = nc.file_format.lower()
     if 'netcdf4' in file_format:
@@ -48,37 +96,6 @@ def get_file_format(nc: netCDF4.Dataset):
     raise RuntimeError('Unknown file type')
 
 
-def read_site_info(site_name: str) -> dict:
-    """Read site information from Cloudnet http API."""
-    url = f"https://cloudnet.fmi.fi/api/sites?developer"
-    sites = requests.get(url=url).json()
-    for site in sites:
-        if site['id'] == site_name:
-            site['id'] = site_name
-            site['name'] = site.pop('humanReadableName')
-            return site
-
-
-def get_product_types(level: int = None) -> list:
-    """Return Cloudnet processing types."""
-    url = f"https://cloudnet.fmi.fi/api/products"
-    products = requests.get(url=url).json()
-    l1_types = [product['id'] for product in products if int(product['level']) == 1]
-    l2_types = [product['id'] for product in products if int(product['level']) == 2]
-    l1_types.remove('categorize')
-    if level == 1:
-        return l1_types
-    if level == 2:
-        return l2_types
-    return l1_types + ['categorize'] + l2_types
-
-
-def get_model_types() -> list:
-    url = f"https://cloudnet.fmi.fi/api/models"
-    models = requests.get(url=url).json()
-    return [model['id'] for model in models]
-
-
 def date_string_to_date(date_string: str) -> datetime.date:
     """Convert YYYY-MM-DD to Python date."""
     date = [int(x) for x in date_string.split('-')]
@@ -165,22 +182,39 @@ def get_var_id(cloudnet_file_type: str, field: str) -> str:
 
 def sha256sum(filename: str) -> str:
     """Calculates hash of file using sha-256."""
-    return _calc_hash_sum(filename, 'sha256')
+    return get_digests(filename)['sha256'].hex()
 
 
 def md5sum(filename: str, is_base64=False) -> str:
     """Calculates hash of file using md5."""
-    return _calc_hash_sum(filename, 'md5', is_base64)
+    digest = get_digests(filename)['md5']
+    if is_base64:
+        return base64.encodebytes(digest).decode('utf-8').strip()
+    return digest.hex()
 
 
-def _calc_hash_sum(filename, method, is_base64=False):
-    hash_sum = getattr(hashlib, method)()
-    with open(filename, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            hash_sum.update(byte_block)
-    if is_base64:
-        return base64.encodebytes(hash_sum.digest()).decode('utf-8').strip()
-    return hash_sum.hexdigest()
+def get_digests(filename: str) -> dict:
+    """Calculates md5 and sha-256 digests of file in one pass.
+
+    Digests are cached by the path, size and modification time of the file,
+    so an unchanged file is read only once.
+    """
+    stat = os.stat(filename)
+    key = (os.path.realpath(filename), stat.st_size, stat.st_mtime_ns)
+    with _DIGEST_LOCK:
+        if key in _DIGEST_CACHE:
+            return _DIGEST_CACHE[key]
+    hash_sums = {method: getattr(hashlib, method)() for method in ('md5', 'sha256')}
+    with open(filename, 'rb') as f:
+        for byte_block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            for hash_sum in hash_sums.values():
+                hash_sum.update(byte_block)
+    digests = {method: hash_sum.digest() for method, hash_sum in hash_sums.items()}
+    with _DIGEST_LOCK:
+        if len(_DIGEST_CACHE) >= MAX_CACHED_DIGESTS:
+            del _DIGEST_CACHE[next(iter(_DIGEST_CACHE))]
+        _DIGEST_CACHE[key] = digests
+    return digests
 
 
 def get_product_bucket(volatile: bool = False) -> str:
@@ -189,9 +223,10 @@ def get_product_bucket(volatile: bool = False) -> str:
 
 def is_volatile_file(filename: str) -> bool:
     """Check if nc-file is volatile."""
-    nc = netCDF4.Dataset(filename)
-    is_missing_pid = not hasattr(nc, 'pid')
-    nc.close()
+    with NC_LOCK:
+        nc = netCDF4.Dataset(filename)
+        is_missing_pid = not hasattr(nc, 'pid')
+        nc.close()
     return is_missing_pid
 
 
@@ -219,3 +254,10 @@ class RawDataMissingError(Exception):
     def __init__(self, msg: str):
         self.message = msg
         super().__init__(self.message)
+
+
+class ChecksumError(Exception):
+    """Internal exception class."""
+    def __init__(self, msg: str):
+        self.message = msg
+        super().__init__(self.message)
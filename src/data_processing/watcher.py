@@ -0,0 +1,65 @@
+"""Watching for new raw data uploads."""
+import time
+from typing import Callable
+from data_processing.metadata_api import MetadataApi
+
+
+class Debouncer:
+    """Groups arriving uploads by (site, date, instrument or model) until they settle.
+
+    A group is settled when no new or updated upload has arrived to it for `delay` seconds,
+    so that a day of e.g. hourly ceilometer files is processed once and not after each file.
+
+    Args:
+        delay (float): Settling time in seconds.
+        clock (function, optional): Returns current time in seconds.
+
+    """
+
+    def __init__(self, delay: float, clock: Callable = time.time):
+        self.delay = delay
+        self._clock = clock
+        self._seen = {}
+        self._pending = {}
+
+    def update(self, uploads: list) -> None:
+        """Adds new and updated uploads from the full list of uploads waiting for processing."""
+        now = self._clock()
+        waiting = {row['uuid'] for row in uploads}
+        self._seen = {uuid: updated_at for uuid, updated_at in self._seen.items()
+                      if uuid in waiting}
+        for row in uploads:
+            if self._seen.get(row['uuid']) == row['updatedAt']:
+                continue
+            self._seen[row['uuid']] = row['updatedAt']
+            key = get_upload_key(row)
+            group = self._pending.setdefault(key, {'rows': {}})
+            group['rows'][row['uuid']] = row
+            group['last_change'] = now
+
+    def pop_settled(self) -> list:
+        """Returns settled groups as (key, uploads) tuples and stops tracking them."""
+        now = self._clock()
+        settled = [key for key, group in self._pending.items()
+                   if now - group['last_change'] >= self.delay]
+        return [(key, list(self._pending.pop(key)['rows'].values())) for key in sorted(settled)]
+
+    def forget(self, uploads: list) -> None:
+        """Forgets uploads, e.g. after failed processing, so that they arrive again."""
+        for row in uploads:
+            self._seen.pop(row['uuid'], None)
+
+
+def get_upload_key(row: dict) -> tuple:
+    source = row['instrument'] or row['model']
+    return row['site']['id'], row['measurementDate'], source['id']
+
+
+def fetch_unprocessed_uploads(md_api: MetadataApi, site: str) -> list:
+    """Returns metadata of the uploads of a site waiting for processing."""
+    payload = {
+        'site': site,
+        'status': 'uploaded',
+        'developer': True
+    }
+    return [row for row in md_api.get('upload-metadata', payload) if row['status'] == 'uploaded']
@@ -0,0 +1,97 @@
+"""Pool of worker processes for CPU-bound processing steps."""
+import os
+import warnings
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+
+class WorkerPool:
+    """Runs functions in a pool of worker processes started on first use.
+
+    netCDF4 (HDF5) and matplotlib are not thread-safe, so processing steps running
+    concurrently in threads (conversions, categorize, Level 2 products, quicklooks) are
+    executed in worker processes instead. Functions and their arguments must be picklable,
+    i.e., functions must be defined at the top level of an importable module.
+
+    If a worker process dies, the waiting tasks raise BrokenProcessPool and a new pool is
+    started for the next tasks.
+
+    Args:
+        max_workers (int, optional): Number of worker processes. Default is the number
+            of CPUs.
+        max_tasks (int, optional): Number of tasks after which the worker processes are
+            replaced by new ones, e.g., to release memory leaked by matplotlib. Default is
+            to keep the processes.
+
+    """
+
+    def __init__(self, max_workers: int = None, max_tasks: int = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_tasks = max_tasks
+        self._executor = None
+        self._n_tasks = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['_n_tasks'] = 0
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def submit(self, fun: Callable, *args, **kwargs) -> Future:
+        """Starts running a function in a worker process. Returns its future."""
+        with self._lock:
+            try:
+                return self._get_executor().submit(fun, *args, **kwargs)
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                return self._get_executor().submit(fun, *args, **kwargs)
+
+    def run(self, fun: Callable, *args, **kwargs):
+        """Runs a function in a worker process and waits for it. Returns its return value."""
+        return self.submit(fun, *args, **kwargs).result()
+
+    def close(self) -> None:
+        """Waits for the running tasks and stops the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is not None and self.max_tasks and self._n_tasks >= self.max_tasks:
+            # Workers of the old pool exit after finishing the tasks already submitted
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._executor is None:
+            context = multiprocessing.get_context('forkserver')
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                                 initializer=_init_worker,
+                                                 initargs=(warnings.filters,))
+            self._n_tasks = 0
+        self._n_tasks += 1
+        return self._executor
+
+
+def set_preload(modules: list) -> None:
+    """Sets modules imported by the server process forking the worker processes.
+
+    Workers then start with the modules already imported. The server process is shared by
+    all forkserver pools and started with the first of them, so this has to be called
+    before any pool is started.
+    """
+    multiprocessing.get_context('forkserver').set_forkserver_preload(modules)
+
+
+def _init_worker(filters: list) -> None:
+    """Uses the warning filters of the parent process."""
+    warnings.filters[:] = filters
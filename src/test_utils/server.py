@@ -1,4 +1,5 @@
 import os
+import json
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from sys import argv
 
@@ -21,9 +22,17 @@ class Server(BaseHTTPRequestHandler):
         self.path = self.path.split('?')[0]
 
         # Connection refused if request not read
+        body = b''
         if 'Content-Length' in self.headers:
             content_length = int(self.headers['Content-Length'])
-            self.rfile.read(content_length)
+            body = self.rfile.read(content_length)
+
+        # Bulk request: a list of payloads, answered with the accepted payloads
+        items = self.parse_bulk_body(body)
+        if items is not None:
+            self._set_headers(code)
+            self.wfile.write(json.dumps(items).encode())
+            return
 
         try:
             file = open(f'{root}{self.path}', 'rb')
@@ -50,6 +59,14 @@ class Server(BaseHTTPRequestHandler):
     def handle_error(self, request, client_address):
         pass
 
+    @staticmethod
+    def parse_bulk_body(body):
+        try:
+            items = json.loads(body)
+        except ValueError:
+            return None
+        return items if isinstance(items, list) else None
+
     @staticmethod
     def try_to_open_file(path):
         try:
@@ -40,13 +40,11 @@ class TestCategorizeProcessing:
         f = open(f'{SCRIPT_PATH}/md.log')
         data = f.readlines()
         n_img = len(self.images)
-        n_gets = len(utils.get_product_types(level=1)) + 1
+        n_gets = 1
         n_puts = 1
         assert len(data) == n_gets + n_img + n_puts
         suffix = 'dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest&developer=True'
-        assert f'GET /api/files?{suffix}&showLegacy=True HTTP/1.1" 200' in data[0]
-        for row in data[1:n_gets]:
-            assert f'GET /api/files?{suffix} HTTP/1.1" 200' in row
+        assert f'GET /api/files?{suffix}&showLegacy=True&allModels=True HTTP/1.1" 200' in data[0]
         assert f'PUT /files/20201022_bucharest_{self.product}.nc HTTP/1.1" 201' in data[n_gets]
         for row in data[n_gets+1:]:
             assert f'PUT /visualizations/20201022_bucharest_{self.product}' in row
@@ -66,7 +66,7 @@ class TestChm15kProcessing:
         n_img = len(self.images)
         n_gets = 3
         n_puts = 1
-        n_posts = 3
+        n_posts = 1
         assert len(data) == n_gets + n_puts + n_img + n_posts
         suffix = 'dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest'
         assert f'GET /api/files?{suffix}' in data[1]
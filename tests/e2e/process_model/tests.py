@@ -39,11 +39,11 @@ class TestModelProcessing:
 
         n_valid_metadata = 2
 
-        n_upload_gets = 1 + n_valid_metadata  # +1 because of initial check for valid models
+        n_upload_gets = 1
         n_file_puts = n_valid_metadata
         n_metadata_posts = n_valid_metadata
         n_img_puts = len(self.images) * n_valid_metadata - 1  # -1 because of gdas1
-        n_api_files_gets = n_valid_metadata
+        n_api_files_gets = n_valid_metadata  # initial fetch + refetch after first upload
 
         assert len(data) == (n_upload_gets + n_file_puts + n_metadata_posts
                              + n_img_puts + n_api_files_gets)
@@ -55,8 +55,8 @@ class TestModelProcessing:
                     n += 1
             assert n == n_expected
 
-        s = '"GET /api/files?dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest&developer=True&showLegacy=True&model='
-        count_strings(s, n_valid_metadata)
+        s = '"GET /api/files?dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest&developer=True&showLegacy=True&allModels=True'
+        count_strings(s, n_api_files_gets)
 
         s = '"PUT /visualizations/20201022_bucharest_'
         count_strings(s, n_img_puts)
@@ -65,7 +65,7 @@ class TestModelProcessing:
         count_strings(s, n_metadata_posts)
 
         s = '"GET /upload-metadata?dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest&developer=True HTTP/1.1" 200'
-        count_strings(s, n_upload_gets - 1)
+        count_strings(s, n_upload_gets)
 
         s = '"PUT /files/20201022_bucharest_'
         count_strings(s, n_file_puts)
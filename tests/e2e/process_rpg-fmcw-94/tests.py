@@ -43,7 +43,7 @@ class TestRPGFMCW94Processing:
         n_img = len(self.images)
         n_gets = 2
         n_puts = 1
-        n_posts = 2
+        n_posts = 1
         assert len(data) == n_gets + n_puts + n_img + n_posts
         suffix = 'dateFrom=2020-10-22&dateTo=2020-10-22&site=bucharest'
         assert f'GET /api/files?{suffix}' in data[0]
@@ -0,0 +1,36 @@
+import os
+import pickle
+from data_processing.artifacts import ArtifactRegistry
+
+
+class TestArtifactRegistry:
+
+    def test_returns_file_with_matching_uuid(self, tmpdir):
+        product_file = tmpdir.join('temp')
+        product_file.write('abc')
+        registry = ArtifactRegistry()
+        artifact = registry.add('2020-10-22', 'radar', str(product_file), 'a',
+                                '20201022_bucharest_rpg-fmcw-94.nc')
+        product_file.remove()
+        assert registry.get('2020-10-22', 'radar', 'a') == artifact
+        assert artifact.endswith('/20201022_bucharest_rpg-fmcw-94.nc')
+        assert open(artifact).read() == 'abc'
+        assert registry.get('2020-10-22', 'radar', 'b') is None
+        assert registry.get('2020-10-23', 'radar', 'a') is None
+
+    def test_release(self, tmpdir):
+        product_file = tmpdir.join('temp')
+        product_file.write('abc')
+        registry = ArtifactRegistry()
+        artifact = registry.add('2020-10-22', 'lidar', str(product_file), 'a', 'lidar.nc')
+        registry.release('2020-10-22')
+        assert registry.get('2020-10-22', 'lidar', 'a') is None
+        assert not os.path.exists(artifact)
+
+    def test_pickled_registry_is_empty(self, tmpdir):
+        product_file = tmpdir.join('temp')
+        product_file.write('abc')
+        registry = ArtifactRegistry()
+        registry.add('2020-10-22', 'lidar', str(product_file), 'a', 'lidar.nc')
+        registry = pickle.loads(pickle.dumps(registry))
+        assert registry.get('2020-10-22', 'lidar', 'a') is None
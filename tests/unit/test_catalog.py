@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import pytest
+import requests
+from data_processing.catalog import Catalog
+from test_utils import utils as test_utils
+
+session, adapter, mock_addr = test_utils.init_test_session()
+
+products = [
+    {'id': 'categorize', 'level': '1'},
+    {'id': 'classification', 'level': '2'},
+    {'id': 'lidar', 'level': '1'},
+    {'id': 'radar', 'level': '1'},
+]
+sites = [{'id': 'bucharest', 'humanReadableName': 'Bucharest', 'type': ['cloudnet']}]
+
+
+class TestCatalog:
+
+    @pytest.fixture(autouse=True)
+    def _init(self, tmpdir):
+        self.cache_dir = str(tmpdir)
+        self.config = {
+            'METADATASERVER': {'url': mock_addr},
+            'CATALOG': {'cache_dir': self.cache_dir, 'ttl_hours': '1', 'offline': 'False'}
+        }
+        adapter.register_uri('GET', f'{mock_addr}api/products', json=products)
+        adapter.register_uri('GET', f'{mock_addr}api/sites?developer=True', json=sites)
+        adapter.register_uri('GET', f'{mock_addr}api/models', json=[{'id': 'ecmwf'}])
+
+    def _count_requests(self) -> int:
+        return len(adapter.request_history)
+
+    def test_get_product_types(self):
+        catalog = Catalog(self.config, session)
+        assert catalog.get_product_types() == ['lidar', 'radar', 'categorize', 'classification']
+        assert catalog.get_product_types(level=1) == ['lidar', 'radar']
+        assert catalog.get_product_types(level=2) == ['classification']
+
+    def test_get_site_info(self):
+        catalog = Catalog(self.config, session)
+        site = catalog.get_site_info('bucharest')
+        assert site['id'] == 'bucharest'
+        assert site['name'] == 'Bucharest'
+        assert catalog.get_site_info('bucharest')['name'] == 'Bucharest'
+        assert catalog.get_site_info('mace-head') is None
+
+    def test_get_model_types(self):
+        catalog = Catalog(self.config, session)
+        assert catalog.get_model_types() == ['ecmwf']
+
+    def test_fetches_only_once(self):
+        n_before = self._count_requests()
+        catalog = Catalog(self.config, session)
+        for _ in range(3):
+            catalog.get_product_types()
+        assert self._count_requests() == n_before + 1
+
+    def test_reloads_after_ttl(self, monkeypatch):
+        catalog = Catalog(self.config, session)
+        catalog.get_product_types()
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 3600)
+        n_before = self._count_requests()
+        catalog.get_product_types()
+        catalog.get_product_types()
+        assert self._count_requests() == n_before + 1
+
+    def test_uses_disk_cache(self):
+        Catalog(self.config, session).get_product_types()
+        n_before = self._count_requests()
+        assert Catalog(self.config, session).get_product_types(level=2) == ['classification']
+        assert self._count_requests() == n_before
+
+    def test_refreshes_outdated_cache(self):
+        Catalog(self.config, session).get_product_types()
+        cache_file = os.path.join(self.cache_dir, 'products.json')
+        two_hours_ago = time.time() - 7200
+        os.utime(cache_file, (two_hours_ago, two_hours_ago))
+        n_before = self._count_requests()
+        Catalog(self.config, session).get_product_types()
+        assert self._count_requests() == n_before + 1
+
+    def test_offline_mode(self):
+        with open(os.path.join(self.cache_dir, 'products.json'), 'w') as file:
+            json.dump([{'id': 'categorize', 'level': '1'}, {'id': 'mwr', 'level': '1'}], file)
+        os.utime(os.path.join(self.cache_dir, 'products.json'), (0, 0))
+        self.config['CATALOG']['offline'] = 'True'
+        n_before = self._count_requests()
+        catalog = Catalog(self.config, session)
+        assert catalog.get_product_types(level=1) == ['mwr']
+        with pytest.raises(RuntimeError):
+            catalog.get_model_types()
+        assert self._count_requests() == n_before
+
+    def test_uses_outdated_cache_if_server_fails(self):
+        Catalog(self.config, session).get_model_types()
+        os.utime(os.path.join(self.cache_dir, 'models.json'), (0, 0))
+        adapter.register_uri('GET', f'{mock_addr}api/models',
+                             exc=requests.exceptions.ConnectionError)
+        assert Catalog(self.config, session).get_model_types() == ['ecmwf']
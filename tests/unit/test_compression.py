@@ -0,0 +1,47 @@
+import netCDF4
+import pytest
+from data_processing import compression
+
+
+def test_get_chunk_sizes(nc_file):
+    f = netCDF4.Dataset(nc_file)
+    assert compression.get_chunk_sizes(f, ('time', 'range'), 4, 1024**2) == [10, 5]
+    assert compression.get_chunk_sizes(f, ('time', 'range'), 4, 40) == [2, 5]
+    assert compression.get_chunk_sizes(f, (), 4, 1024**2) is None
+    f.close()
+
+
+@pytest.mark.parametrize("dimensions, role", [
+    ((), compression.CONSTANT),
+    (('range',), compression.CONSTANT),
+    (('time',), compression.SERIES),
+    (('time', 'range'), compression.PROFILE),
+])
+def test_get_role(dimensions, role):
+    assert compression.get_role(dimensions) == role
+
+
+class TestProfile:
+
+    def test_get_options(self, nc_file):
+        profile = compression.get_profile('archive-small')
+        f = netCDF4.Dataset(nc_file)
+        options = profile.get_options(f, ('time', 'range'), 4)
+        assert options == {'zlib': True, 'shuffle': True, 'complevel': 9,
+                           'chunksizes': [10, 5]}
+        f.close()
+
+    def test_no_compression(self, nc_file):
+        profile = compression.get_profile('fast-write')
+        f = netCDF4.Dataset(nc_file)
+        assert profile.get_options(f, ('range',), 4) == {'zlib': False, 'shuffle': False}
+        f.close()
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            compression.get_profile('foo')
+
+    def test_configured_profile(self):
+        assert compression.get_configured_profile({}) is None
+        config = {'COMPRESSION': {'profile': 'fast-write'}}
+        assert compression.get_configured_profile(config).name == 'fast-write'
@@ -1,3 +1,5 @@
+import glob
+import shutil
 import numpy as np
 import netCDF4
 import pytest
@@ -18,14 +20,123 @@ def test_get_dtype():
     assert lib._get_dtype('foo', data_float) == 'f4'
 
 
-@pytest.mark.parametrize("size, result", [
-    (np.zeros((10, 5)), ('time', 'range')),
-    (np.zeros((5, 10)), ('range', 'time')),
-    (np.zeros((5, )), ('range', )),
-    (np.zeros((10, )), ('time', )),
-    (np.zeros((100, )), ('time', )),
-    (np.zeros((3, 1000)), ('other', 'time')),
-])
-def test_get_dim(size, result, nc_file):
-    f = netCDF4.Dataset(nc_file)
-    assert lib._get_dim(f, size) == result
+def test_remove_files_with_wrong_filename_date():
+    files = ['/foo/00100_A202010212350_CHM170137.nc',
+             '/foo/00100_A202010220835_CHM170137.nc',
+             '/foo/chm15k.nc']
+    result = lib._remove_files_with_wrong_filename_date(files, '2020-10-22')
+    assert result == files[1:]
+
+
+def test_concat_chm15k_files(tmpdir):
+    files = glob.glob('tests/data/raw/chm15k/*.nc')
+    output_file = str(tmpdir.join('chm15k.nc'))
+    valid_files = lib.concat_files('chm15k', files, '2020-10-22', output_file)
+    assert len(valid_files) == 3
+    assert valid_files == sorted(valid_files)
+    with netCDF4.Dataset(output_file) as nc:
+        assert len(nc.dimensions['time']) == 30
+        assert nc['beta_raw'].shape == (30, 1024)
+        assert np.all(np.diff(nc['time'][:]) > 0)
+
+
+def test_concat_opens_each_file_once(tmpdir, monkeypatch):
+    files = glob.glob('tests/data/raw/chm15k/*.nc')
+    opened = []
+    dataset = netCDF4.Dataset
+
+    def _open(filename, *args, **kwargs):
+        opened.append(filename)
+        return dataset(filename, *args, **kwargs)
+
+    monkeypatch.setattr(lib.netCDF4, 'Dataset', _open)
+    output_file = str(tmpdir.join('chm15k.nc'))
+    valid_files = lib.concat_files('chm15k', files, '2020-10-22', output_file)
+    assert sorted(opened) == sorted(valid_files + [output_file])
+
+
+def test_concat_chm15k_files_overlapping_in_time(tmpdir):
+    file = sorted(glob.glob('tests/data/raw/chm15k/*.nc'))[-1]
+    copy = str(tmpdir.join('00100_A202010221905_CHM170137.nc'))
+    shutil.copyfile(file, copy)
+    output_file = str(tmpdir.join('chm15k.nc'))
+    valid_files = lib.concat_files('chm15k', [file, copy], '2020-10-22', output_file)
+    assert valid_files == sorted([file, copy])
+    with netCDF4.Dataset(file) as nc, netCDF4.Dataset(output_file) as daily:
+        assert len(daily.dimensions['time']) == 2 * len(nc.dimensions['time'])
+
+
+def test_append_chm15k_files(tmpdir):
+    files = sorted(glob.glob('tests/data/raw/chm15k/*.nc'))
+    full_file = str(tmpdir.join('full.nc'))
+    daily_file = str(tmpdir.join('daily.nc'))
+    lib.concat_files('chm15k', files, '2020-10-22', full_file)
+    lib.concat_files('chm15k', files[:2], '2020-10-22', daily_file, unlimited_time=True)
+    assert lib.append_files('chm15k', files[2:], '2020-10-22', daily_file) == files[2:]
+    with netCDF4.Dataset(full_file) as full, netCDF4.Dataset(daily_file) as daily:
+        for key in lib.CONSTANTS + lib.VARIABLES:
+            assert np.array_equal(full[key][:], daily[key][:])
+
+
+def test_append_chm15k_files_in_wrong_order(tmpdir):
+    files = sorted(glob.glob('tests/data/raw/chm15k/*.nc'))
+    daily_file = str(tmpdir.join('daily.nc'))
+    lib.concat_files('chm15k', files[2:], '2020-10-22', daily_file, unlimited_time=True)
+    with pytest.raises(ValueError):
+        lib.append_files('chm15k', files[1:2], '2020-10-22', daily_file)
+    with netCDF4.Dataset(daily_file) as nc:
+        assert len(nc.dimensions['time']) == 20
+
+
+def test_append_overlapping_chm15k_files(tmpdir):
+    files = sorted(glob.glob('tests/data/raw/chm15k/*.nc'))
+    copy = str(tmpdir.join('00100_A202010221905_CHM170137.nc'))
+    shutil.copyfile(files[-1], copy)
+    daily_file = str(tmpdir.join('daily.nc'))
+    lib.concat_files('chm15k', files[1:2], '2020-10-22', daily_file, unlimited_time=True)
+    with pytest.raises(ValueError):
+        lib.append_files('chm15k', files[2:] + [copy], '2020-10-22', daily_file)
+    with netCDF4.Dataset(daily_file) as nc:
+        assert len(nc.dimensions['time']) == 10
+
+
+def test_concat_text_files(tmpdir):
+    messages = {
+        'A1.DAT': b'-2020-10-21 23:59:50\r\nCL010\r\n-2020-10-22 00:00:10\r\nCL011\r\n',
+        'A2.DAT': b'-2020-10-22 00:00:30\r\nCL012\r\n',
+        'A3.DAT': b'-2020-10-23 00:00:10\r\nCL013\r\n',
+    }
+    files = []
+    for filename, content in messages.items():
+        tmpdir.join(filename).write_binary(content)
+        files.append(str(tmpdir.join(filename)))
+    output_file = str(tmpdir.join('daily.DAT'))
+    valid_files = lib.concat_files('cl51', files[::-1], '2020-10-22', output_file)
+    assert valid_files == files[:2]
+    assert tmpdir.join('daily.DAT').read_binary() == (b'-2020-10-22 00:00:10\r\nCL011\r\n'
+                                                      b'-2020-10-22 00:00:30\r\nCL012\r\n')
+    with pytest.raises(ValueError):
+        lib.concat_files('cl51', files[2:], '2020-10-22', output_file)
+
+
+def test_append_text_files(tmpdir):
+    tmpdir.join('A1.DAT').write_binary(b'-2020-10-22 00:00:10\r\nCL011\r\n')
+    tmpdir.join('A2.DAT').write_binary(b'-2020-10-22 00:00:30\r\nCL012\r\n')
+    daily_file = str(tmpdir.join('daily.DAT'))
+    lib.concat_files('cl51', [str(tmpdir.join('A1.DAT'))], '2020-10-22', daily_file,
+                     unlimited_time=True)
+    assert lib.append_files('cl51', [str(tmpdir.join('A2.DAT'))], '2020-10-22',
+                            daily_file) == [str(tmpdir.join('A2.DAT'))]
+    assert tmpdir.join('daily.DAT').read_binary() == (b'-2020-10-22 00:00:10\r\nCL011\r\n'
+                                                      b'-2020-10-22 00:00:30\r\nCL012\r\n')
+
+
+def test_append_text_files_in_wrong_order(tmpdir):
+    tmpdir.join('A1.DAT').write_binary(b'-2020-10-22 00:00:10\r\nCL011\r\n')
+    tmpdir.join('A2.DAT').write_binary(b'-2020-10-22 00:00:30\r\nCL012\r\n')
+    daily_file = str(tmpdir.join('daily.DAT'))
+    lib.concat_files('cl51', [str(tmpdir.join('A2.DAT'))], '2020-10-22', daily_file,
+                     unlimited_time=True)
+    with pytest.raises(ValueError):
+        lib.append_files('cl51', [str(tmpdir.join('A1.DAT'))], '2020-10-22', daily_file)
+    assert tmpdir.join('daily.DAT').read_binary() == b'-2020-10-22 00:00:30\r\nCL012\r\n'
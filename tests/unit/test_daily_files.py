@@ -0,0 +1,61 @@
+import os
+import pytest
+from data_processing.daily_files import DailyFileCache, get_manifest_entries
+
+KEY = ('bucharest', '2020-10-22', 'chm15k.nc')
+
+
+def _upload(uuid: str, filename: str, checksum: str = 'abc') -> dict:
+    return {'uuid': uuid, 'filename': filename, 'checksum': checksum}
+
+
+class TestDailyFileCache:
+
+    uploads = [_upload('a', 'A0100.nc'), _upload('b', 'A0200.nc')]
+
+    @pytest.fixture(autouse=True)
+    def _init(self, tmpdir):
+        self.cache = DailyFileCache(str(tmpdir), max_age=3600)
+        open(self.cache.get_path(*KEY), 'w').close()
+        manifest = get_manifest_entries(self.uploads, ['/a', '/b'], ['/a'])
+        self.cache.save_manifest(*KEY, manifest)
+
+    def test_new_uploads_are_appended(self):
+        new = _upload('c', 'A0300.nc')
+        manifest, new_uploads = self.cache.get_new_uploads(*KEY, [new] + self.uploads)
+        assert [entry['uuid'] for entry in manifest] == ['a', 'b']
+        assert [entry['valid'] for entry in manifest] == [True, False]
+        assert new_uploads == [new]
+
+    def test_no_new_uploads(self):
+        manifest, new_uploads = self.cache.get_new_uploads(*KEY, self.uploads)
+        assert len(manifest) == 2
+        assert new_uploads == []
+
+    def test_changed_upload_rebuilds(self):
+        uploads = [self.uploads[0], _upload('b', 'A0200.nc', checksum='def')]
+        manifest, new_uploads = self.cache.get_new_uploads(*KEY, uploads)
+        assert manifest == []
+        assert new_uploads == uploads
+
+    def test_earlier_upload_rebuilds(self):
+        uploads = self.uploads + [_upload('c', 'A0000.nc')]
+        manifest, new_uploads = self.cache.get_new_uploads(*KEY, uploads)
+        assert manifest == []
+        assert [row['uuid'] for row in new_uploads] == ['c', 'a', 'b']
+
+    def test_invalidate(self):
+        self.cache.invalidate(*KEY)
+        manifest, new_uploads = self.cache.get_new_uploads(*KEY, self.uploads)
+        assert manifest == []
+        assert new_uploads == self.uploads
+
+    def test_old_dates_are_pruned(self):
+        old_key = ('bucharest', '2020-10-01', 'chm15k.nc')
+        old_file = self.cache.get_path(*old_key)
+        open(old_file, 'w').close()
+        for filename in (old_file, os.path.dirname(old_file)):
+            os.utime(filename, (0, 0))
+        self.cache.save_manifest(*KEY, [])
+        assert not os.path.exists(os.path.dirname(old_file))
+        assert os.path.isfile(self.cache.get_path(*KEY))
@@ -0,0 +1,50 @@
+import os
+import time
+from data_processing import utils
+from data_processing.file_cache import FileCache, create_file_cache
+
+
+def _write(filename: str, content: bytes) -> str:
+    with open(filename, 'wb') as file:
+        file.write(content)
+    return utils.md5sum(filename)
+
+
+class TestFileCache:
+
+    def test_get_after_put(self, tmpdir):
+        cache = FileCache(str(tmpdir.join('cache')), 1000)
+        checksum = _write(str(tmpdir.join('a')), b'abc')
+        assert cache.get(checksum, str(tmpdir.join('b'))) is False
+        cache.put(checksum, str(tmpdir.join('a')))
+        assert cache.get(checksum, str(tmpdir.join('b'))) is True
+        assert tmpdir.join('b').read_binary() == b'abc'
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_rejects_corrupted_file(self, tmpdir):
+        cache = FileCache(str(tmpdir.join('cache')), 1000)
+        checksum = _write(str(tmpdir.join('a')), b'abc')
+        cache.put(checksum, str(tmpdir.join('a')))
+        _write(cache._get_cache_path(checksum), b'abd')
+        assert cache.get(checksum, str(tmpdir.join('b'))) is False
+        assert not os.path.exists(cache._get_cache_path(checksum))
+        assert not tmpdir.join('b').exists()
+
+    def test_evicts_least_recently_used(self, tmpdir):
+        cache = FileCache(str(tmpdir.join('cache')), 10)
+        checksums = [_write(str(tmpdir.join(name)), name.encode() * 4) for name in 'abc']
+        for name, checksum in zip('ab', checksums):
+            cache.put(checksum, str(tmpdir.join(name)))
+        past = time.time() - 100
+        os.utime(cache._get_cache_path(checksums[1]), (past, past))
+        cache.put(checksums[2], str(tmpdir.join('c')))
+        assert os.path.exists(cache._get_cache_path(checksums[0]))
+        assert not os.path.exists(cache._get_cache_path(checksums[1]))
+        assert os.path.exists(cache._get_cache_path(checksums[2]))
+
+
+def test_create_file_cache():
+    assert create_file_cache({}) is None
+    cache = create_file_cache({'FILE-CACHE': {'cache_dir': '/foo', 'max_size_gb': '0.5'}})
+    assert cache.cache_dir == '/foo'
+    assert cache.max_size == 512 * 1024**2
@@ -0,0 +1,31 @@
+from data_processing.fingerprints import get_fingerprint, FingerprintStore
+
+inputs = [
+    {'uuid': 'a', 'checksum': '123'},
+    {'uuid': 'b', 'checksum': '456'},
+]
+
+
+class TestGetFingerprint:
+
+    def test_does_not_depend_on_order(self):
+        assert get_fingerprint(inputs, '1.6.0') == get_fingerprint(inputs[::-1], '1.6.0')
+
+    def test_changes_with_checksum(self):
+        changed = [inputs[0], {'uuid': 'b', 'checksum': '789'}]
+        assert get_fingerprint(inputs, '1.6.0') != get_fingerprint(changed, '1.6.0')
+
+    def test_changes_with_cloudnetpy_version(self):
+        assert get_fingerprint(inputs, '1.6.0') != get_fingerprint(inputs, '1.6.1')
+
+
+class TestFingerprintStore:
+
+    def test_set_and_get(self, tmpdir):
+        store = FingerprintStore(str(tmpdir))
+        assert store.get('bucharest', '2020-10-22', 'categorize') is None
+        store.set('bucharest', '2020-10-22', 'categorize', 'abc', 'uuid-1')
+        store.set('bucharest', '2020-10-22', 'categorize', 'def', 'uuid-1')
+        assert store.get('bucharest', '2020-10-22', 'categorize') == {'fingerprint': 'def',
+                                                                      'uuid': 'uuid-1'}
+        assert store.get('bucharest', '2020-10-22', 'classification') is None
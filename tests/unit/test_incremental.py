@@ -0,0 +1,79 @@
+import re
+import pytest
+from data_processing import incremental
+from data_processing.metadata_api import MetadataApi
+from test_utils import utils
+
+session, adapter, mock_addr = utils.init_test_session()
+l1_products = ['lidar', 'model', 'mwr', 'radar']
+l2_products = ['classification', 'iwc']
+
+
+def _upload(date_str: str, instrument_type: str = None, model: str = None) -> dict:
+    return {'measurementDate': date_str,
+            'instrument': {'type': instrument_type} if instrument_type else None,
+            'model': {'id': model} if model else None}
+
+
+def _file(date_str: str, product: str) -> dict:
+    return {'measurementDate': date_str, 'product': {'id': product}}
+
+
+class TestPlanJobs:
+
+    def test_new_raw_data(self):
+        uploads = [_upload('2020-10-22', 'lidar'), _upload('2020-10-21', model='ecmwf')]
+        jobs = incremental.plan_jobs(uploads, [], l1_products, l2_products)
+        assert jobs == {
+            '2020-10-21': ['model', 'categorize', 'classification', 'iwc'],
+            '2020-10-22': ['lidar', 'categorize', 'classification', 'iwc'],
+        }
+
+    def test_changed_products(self):
+        files = [_file('2020-10-22', 'categorize'), _file('2020-10-23', 'iwc')]
+        jobs = incremental.plan_jobs([], files, l1_products, l2_products)
+        assert jobs == {'2020-10-22': ['classification', 'iwc']}
+
+
+class TestCursor:
+
+    def test_save_and_load(self, tmpdir):
+        cursor = incremental.Cursor(str(tmpdir), 'bucharest')
+        assert cursor.uploads is None and cursor.files is None
+        cursor.uploads = '2020-12-02T13:42:21.803Z'
+        cursor.save()
+        cursor = incremental.Cursor(str(tmpdir), 'bucharest')
+        assert cursor.uploads == '2020-12-02T13:42:21.803Z'
+        assert cursor.files is None
+
+
+class TestFetchChanges:
+
+    rows = [{'updatedAt': '2020-12-02T13:42:21.803Z'},
+            {'updatedAt': '2020-12-03T10:00:00.000Z'}]
+
+    @pytest.fixture(autouse=True)
+    def _init(self):
+        adapter.register_uri('GET', re.compile(f'{mock_addr}upload-metadata(.*?)'),
+                             json=self.rows)
+        self.md_api = MetadataApi({'METADATASERVER': {'url': mock_addr}}, session)
+
+    def test_filters_by_cursor(self):
+        rows = incremental.fetch_changes(self.md_api, 'bucharest', 'upload-metadata',
+                                         '2020-12-02T13:42:21.803Z', '2020-12-01', '2020-12-05')
+        assert rows == self.rows[1:]
+        assert adapter.last_request.qs['updatedatfrom'] == ['2020-12-02t13:42:21.803z']
+        assert 'datefrom' not in adapter.last_request.qs
+
+    def test_without_cursor(self):
+        rows = incremental.fetch_changes(self.md_api, 'bucharest', 'upload-metadata', None,
+                                         '2020-12-01', '2020-12-05')
+        assert rows == self.rows
+        assert 'updatedatfrom' not in adapter.last_request.qs
+        assert adapter.last_request.qs['datefrom'] == ['2020-12-01']
+        assert adapter.last_request.qs['dateto'] == ['2020-12-05']
+
+    def test_get_latest_update(self):
+        assert incremental.get_latest_update(self.rows, None) == '2020-12-03T10:00:00.000Z'
+        assert incremental.get_latest_update([], '2020-01-01') == '2020-01-01'
+        assert incremental.get_latest_update([], None) is None
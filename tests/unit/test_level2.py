@@ -0,0 +1,18 @@
+import pytest
+from data_processing.level2 import generate_product
+from data_processing.workers import WorkerPool
+
+
+def test_generate_unknown_product():
+    with pytest.raises(ModuleNotFoundError):
+        generate_product('foo', 'categorize.nc', 'foo.nc')
+
+
+def test_worker_error_is_raised(tmpdir):
+    pool = WorkerPool(max_workers=1)
+    try:
+        with pytest.raises(OSError):
+            pool.run(generate_product, 'classification', str(tmpdir.join('missing.nc')),
+                     str(tmpdir.join('classification.nc')))
+    finally:
+        pool.close()
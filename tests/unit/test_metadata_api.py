@@ -1,3 +1,4 @@
+import pickle
 import json
 import pytest
 import requests
@@ -111,3 +112,135 @@ class TestMetadataApi:
         r = md_api.find_volatile_files_to_freeze()
         assert len(r) == 1
         assert r[0]['filename'] == '20200513_granada_rpg-fmcw-94.nc'
+
+
+class TestMetadataIndex:
+
+    files = [
+        {'uuid': 'a', 'measurementDate': '2020-10-22', 'product': {'id': 'radar'},
+         'filename': '20201022_bucharest_rpg-fmcw-94.nc', 'volatile': True},
+        {'uuid': 'b', 'measurementDate': '2020-10-22', 'product': {'id': 'model'},
+         'filename': '20201022_bucharest_gdas1.nc', 'volatile': True,
+         'model': {'id': 'gdas1', 'optimumOrder': 3}},
+        {'uuid': 'c', 'measurementDate': '2020-10-22', 'product': {'id': 'model'},
+         'filename': '20201022_bucharest_ecmwf.nc', 'volatile': True},
+        {'uuid': 'd', 'measurementDate': '2020-10-23', 'product': {'id': 'radar'},
+         'filename': '20201023_bucharest_rpg-fmcw-94.nc', 'volatile': True, 'legacy': True},
+    ]
+    uploads = [
+        {'uuid': 'e', 'measurementDate': '2020-10-22', 'instrument': {'id': 'hatpro'},
+         'model': None, 'filename': '201022.LWP.NC', 'status': 'uploaded'},
+        {'uuid': 'f', 'measurementDate': '2020-10-22', 'instrument': {'id': 'hatpro'},
+         'model': None, 'filename': '201022.IWV.NC', 'status': 'uploaded'},
+        {'uuid': 'g', 'measurementDate': '2020-10-23', 'instrument': None,
+         'model': {'id': 'ecmwf'}, 'filename': '20201023_bucharest_ecmwf.nc',
+         'status': 'uploaded'},
+    ]
+
+    @pytest.fixture(autouse=True)
+    def _init(self):
+        self.history = []
+        adapter.register_uri('GET', re.compile(f'{mock_addr}api/files(.*?)'),
+                             json=self.files)
+        adapter.register_uri('GET', re.compile(f'{mock_addr}upload-metadata(.*?)'),
+                             json=self.uploads)
+        md_api = metadata_api.MetadataApi(config, session)
+        self.index = metadata_api.MetadataIndex(md_api, 'bucharest', '2020-10-22',
+                                                '2020-10-23')
+
+    def _count_requests(self, end_point: str) -> int:
+        return len([req for req in adapter.request_history
+                    if req.path == f'/{end_point}'])
+
+    def test_fetches_files_once_for_all_dates(self):
+        n_before = self._count_requests('api/files')
+        assert self.index.get_files('2020-10-22', 'radar')[0]['uuid'] == 'a'
+        assert self.index.get_files('2020-10-23', 'radar') == []
+        assert self.index.get_files('2020-10-23', 'radar', show_legacy=True)[0]['uuid'] == 'd'
+        assert self._count_requests('api/files') == n_before + 1
+        query = adapter.last_request.qs
+        assert query['datefrom'] == ['2020-10-22']
+        assert query['dateto'] == ['2020-10-23']
+
+    def test_selects_model(self):
+        assert self.index.get_files('2020-10-22', 'model', model='ecmwf')[0]['uuid'] == 'c'
+        assert self.index.get_files('2020-10-22', 'model', model='gdas1')[0]['uuid'] == 'b'
+        assert self.index.get_files('2020-10-22', 'model')[0]['uuid'] == 'c'
+
+    def test_refetches_invalidated_date(self):
+        self.index.get_files('2020-10-22', 'radar')
+        n_before = self._count_requests('api/files')
+        self.index.invalidate_files('2020-10-22')
+        self.index.get_files('2020-10-22', 'radar')
+        self.index.get_files('2020-10-22', 'model')
+        assert self._count_requests('api/files') == n_before + 1
+        assert adapter.last_request.qs['dateto'] == ['2020-10-22']
+
+    def test_get_uploads(self):
+        n_before = self._count_requests('upload-metadata')
+        uploads = self.index.get_uploads('2020-10-22', instrument='hatpro')
+        assert [row['uuid'] for row in uploads] == ['e']
+        assert self.index.get_uploads('2020-10-23', model='ecmwf')[0]['uuid'] == 'g'
+        assert self.index.get_uploads('2020-10-23', instrument='hatpro') == []
+        assert len(self.index.get_all_uploads()) == 3
+        assert self._count_requests('upload-metadata') == n_before + 1
+
+    def test_set_upload_status(self):
+        self.index.set_upload_status(['e'], 'processed')
+        assert self.index.get_uploads('2020-10-22', instrument='hatpro')[0]['status'] == 'processed'
+
+    def test_index_of_prefetched_date(self):
+        self.index.prefetch()
+        n_before = len(adapter.request_history)
+        index = pickle.loads(pickle.dumps(self.index.for_date('2020-10-23')))
+        assert index.get_files('2020-10-23', 'radar', show_legacy=True)[0]['uuid'] == 'd'
+        assert index.get_files('2020-10-22', 'radar') == []
+        assert [row['uuid'] for row in index.get_all_uploads()] == ['g']
+        assert len(adapter.request_history) == n_before
+
+
+class TestMetadataWriter:
+
+    @pytest.fixture(autouse=True)
+    def _init(self):
+        adapter.register_uri('PUT', re.compile(f'{mock_addr}files/(.*?)'), status_code=201)
+        adapter.register_uri('PUT', re.compile(f'{mock_addr}visualizations/(.*?)'),
+                             status_code=201)
+        adapter.register_uri('POST', f'{mock_addr}upload-metadata', status_code=200)
+        self.n_before = len(adapter.request_history)
+
+    def _get_requests(self) -> list:
+        return [(req.method, req.path, req.json())
+                for req in adapter.request_history[self.n_before:]]
+
+    def _write(self, bulk: bool) -> list:
+        md_config = {**config, 'METADATASERVER': {'url': mock_addr,
+                                                  'bulk_status_updates': str(bulk)}}
+        writer = metadata_api.MetadataWriter(metadata_api.MetadataApi(md_config, session))
+        writer.put('20201022_bucharest_chm15k.nc', {'uuid': 'a'})
+        writer.put_img({'s3key': 'x-beta.png', 'variable_id': 'lidar-beta'}, 'a')
+        writer.put_img({'s3key': 'x-depol.png', 'variable_id': 'lidar-depol'}, 'a')
+        writer.update_statuses(['b', 'c'], 'processed')
+        writer.flush()
+        return self._get_requests()
+
+    def test_sends_file_before_visualizations_and_statuses(self):
+        requests_sent = self._write(bulk=False)
+        assert len(requests_sent) == 5
+        assert requests_sent[0] == ('PUT', '/files/20201022_bucharest_chm15k.nc', {'uuid': 'a'})
+        assert {req[1] for req in requests_sent[1:3]} == {'/visualizations/x-beta.png',
+                                                          '/visualizations/x-depol.png'}
+        statuses = sorted(req[2]['uuid'] for req in requests_sent[3:])
+        assert statuses == ['b', 'c']
+
+    def test_sends_statuses_in_bulk(self):
+        requests_sent = self._write(bulk=True)
+        assert len(requests_sent) == 4
+        assert requests_sent[-1] == ('POST', '/upload-metadata',
+                                     [{'uuid': 'b', 'status': 'processed'},
+                                      {'uuid': 'c', 'status': 'processed'}])
+
+    def test_flush_raises_on_failure(self):
+        adapter.register_uri('POST', f'{mock_addr}upload-metadata', status_code=500)
+        with pytest.raises(requests.exceptions.HTTPError):
+            self._write(bulk=False)
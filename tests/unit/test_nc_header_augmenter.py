@@ -1,3 +1,4 @@
+import numpy as np
 import netCDF4
 import os
 from data_processing import nc_header_augmenter as nca
@@ -73,3 +74,65 @@ class TestModel:
         nc = netCDF4.Dataset(model_file)
         assert nc.title == 'Model file from Bucharest'
         nc.close()
+
+    def test_converts_netcdf3_file(self, tmpdir):
+        model_file = _create_model_file(tmpdir, 'NETCDF3_CLASSIC')
+        nca.fix_model_file(model_file, self.site_name, None)
+        with netCDF4.Dataset(model_file) as nc:
+            assert nc.data_model == 'NETCDF4_CLASSIC'
+            assert nc.location == self.site_name
+
+    def test_fixes_netcdf4_file_in_place(self, tmpdir):
+        model_file = _create_model_file(tmpdir, 'NETCDF4_CLASSIC')
+        inode = os.stat(model_file).st_ino
+        nca.fix_model_file(model_file, self.site_name, 'abc')
+        assert os.stat(model_file).st_ino == inode
+        with netCDF4.Dataset(model_file) as nc:
+            assert nc.file_uuid == 'abc'
+            assert nc.day == '14'
+            assert nc.variables['time'].filters()['complevel'] == 9
+
+
+class TestCopyFileContents:
+
+    @pytest.fixture(autouse=True)
+    def _init(self, tmpdir):
+        self.source_file = str(tmpdir.join('source.nc'))
+        self.target_file = str(tmpdir.join('target.nc'))
+        with netCDF4.Dataset(self.source_file, 'w', format='NETCDF4_CLASSIC') as nc:
+            nc.createDimension('time', 10)
+            nc.createDimension('height', 4)
+            var = nc.createVariable('x', 'f4', ('time', 'height'), fill_value=-999,
+                                    zlib=True, complevel=7, chunksizes=(5, 4))
+            data = np.arange(40, dtype='f4').reshape(10, 4)
+            data[0, 0] = -999
+            var[:] = data
+            var.scale_factor = 2
+            nc.createVariable('scalar', 'i4')[:] = 5
+            nc.title = 'Foo'
+
+    def test_copy_in_blocks(self):
+        with netCDF4.Dataset(self.source_file) as source, \
+                netCDF4.Dataset(self.target_file, 'w', format='NETCDF4_CLASSIC') as target:
+            nca.copy_file_contents(source, target, block_bytes=20)
+        with netCDF4.Dataset(self.source_file) as source, \
+                netCDF4.Dataset(self.target_file) as target:
+            assert np.ma.allequal(source['x'][:], target['x'][:])
+            assert target['x'][0, 0] is np.ma.masked
+            assert target['x'].scale_factor == 2
+            assert target['x'].chunking() == [5, 4]
+            assert target['x'].filters()['complevel'] == 7
+            assert target['scalar'][:] == 5
+            assert target.title == 'Foo'
+
+
+def _create_model_file(tmpdir, file_format: str) -> str:
+    file_name = str(tmpdir.join('model.nc'))
+    with netCDF4.Dataset(file_name, 'w', format=file_format) as nc:
+        nc.createDimension('time', 10)
+        options = {'zlib': True, 'complevel': 9} if file_format.startswith('NETCDF4') else {}
+        time = nc.createVariable('time', 'f8', ('time',), **options)
+        time[:] = np.arange(10)
+        time.units = 'hours since 2020-10-14 00:00:00 +00:00'
+        nc.location = 'Bucharest'
+    return file_name
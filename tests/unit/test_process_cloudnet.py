@@ -0,0 +1,156 @@
+import sys
+import re
+import json
+from contextlib import contextmanager
+import pytest
+from test_utils import utils
+from data_processing.utils import RawDataMissingError
+sys.path.append('scripts/')
+process_cloudnet = __import__("process-cloudnet")
+
+session, adapter, mock_addr = utils.init_test_session()
+
+
+class FakeCatalog:
+
+    @staticmethod
+    def get_product_types(level: int) -> list:
+        return []
+
+
+class FakeArtifacts:
+
+    def release(self, date_str: str) -> None:
+        pass
+
+
+class FakeBreaker:
+    can_recover = False
+
+    @staticmethod
+    def get_summary() -> str:
+        return 'metadata server down'
+
+
+class FakeProcess:
+    site = 'bucharest'
+    catalog = FakeCatalog()
+    artifacts = FakeArtifacts()
+
+    def __init__(self, dates: list, down_dates: tuple = ()):
+        self.dates = dates
+        self.down_dates = down_dates
+        self.n_prefetch = 0
+
+    def prefetch(self) -> None:
+        self.n_prefetch += 1
+
+    def for_date(self, date_str: str) -> 'FakeProcess':
+        return FakeProcess([date_str], self.down_dates)
+
+    @contextmanager
+    def workspace(self, date_str: str):
+        assert self.dates == [date_str]
+        yield
+
+    def get_open_circuits(self) -> list:
+        if len(self.dates) == 1 and self.dates[0] in self.down_dates:
+            return [FakeBreaker()]
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class TestProcessInParallel:
+
+    dates = ['2020-10-22', '2020-10-23', '2020-10-24']
+
+    def test_processes_two_dates(self, capsys):
+        process = FakeProcess(self.dates[:2])
+        plan = {date_str: [] for date_str in self.dates[:2]}
+        is_success, circuits = process_cloudnet._process_in_parallel(process, plan, [], jobs=2)
+        assert is_success is True
+        assert circuits == []
+        assert process.n_prefetch == 1
+        assert capsys.readouterr().out.splitlines() == ['bucharest 2020-10-22',
+                                                        'bucharest 2020-10-23']
+
+    def test_skips_remaining_dates_when_service_down(self, capsys):
+        process = FakeProcess(self.dates, down_dates=('2020-10-22',))
+        plan = {date_str: [] for date_str in self.dates}
+        is_success, circuits = process_cloudnet._process_in_parallel(process, plan, [], jobs=2)
+        assert is_success is False
+        assert circuits == [('metadata server down', False)]
+        assert capsys.readouterr().out.splitlines() == ['bucharest 2020-10-22',
+                                                        'bucharest 2020-10-23',
+                                                        'Skipped 1 remaining dates']
+
+
+class TestIncremental:
+
+    products = [{'id': 'categorize', 'level': '1'}, {'id': 'lidar', 'level': '1'},
+                {'id': 'classification', 'level': '2'}]
+    uploads = [{'measurementDate': '2020-10-22', 'instrument': {'type': 'lidar'},
+                'model': None, 'status': 'processed', 'updatedAt': '2020-12-02T13:42:21.803Z'}]
+    files = [{'measurementDate': '2020-10-22', 'product': {'id': 'classification'},
+              'updatedAt': '2020-12-02T13:45:00.000Z'}]
+
+    def test_saves_cursor_when_nothing_to_process(self, tmpdir, monkeypatch, capsys):
+        with open(tmpdir.join('main.ini'), 'w') as file:
+            file.write(f'[METADATASERVER]\nurl = {mock_addr}\n'
+                       f'[CATALOG]\ncache_dir = {tmpdir}/catalog\n'
+                       f'[INCREMENTAL]\ncursor_dir = {tmpdir}/cursors\n')
+        adapter.register_uri('GET', f'{mock_addr}api/products', json=self.products)
+        adapter.register_uri('GET', re.compile(f'{mock_addr}upload-metadata(.*?)'),
+                             json=self.uploads)
+        adapter.register_uri('GET', re.compile(f'{mock_addr}api/files(.*?)'), json=self.files)
+        monkeypatch.setattr(process_cloudnet.transport, 'create_session', lambda _: session)
+        process_cloudnet.main(['bucharest', '--incremental', f'--config-dir={tmpdir}'])
+        assert capsys.readouterr().out == 'No changes since the previous run\n'
+        with open(tmpdir.join('cursors', 'bucharest.json')) as file:
+            assert json.load(file) == {'uploads': '2020-12-02T13:42:21.803Z',
+                                       'files': '2020-12-02T13:45:00.000Z'}
+
+
+class FakeIndex:
+
+    def __init__(self, uploads: dict):
+        self.uploads = uploads
+
+    def get_uploads(self, date_str: str, instrument: str = None) -> list:
+        return self.uploads.get(instrument, [])
+
+
+class TestConverters:
+
+    @pytest.fixture(autouse=True)
+    def _init(self, monkeypatch):
+        monkeypatch.setitem(process_cloudnet.CONVERTERS, 'disdrometer', {})
+        for instrument in ('parsivel', 'thies-lnm'):
+            process_cloudnet.converter('disdrometer', instrument)(lambda: None)
+        self.process = process_cloudnet.Process.__new__(process_cloudnet.Process)
+        self.process.date_str = '2020-10-22'
+        self.process.is_reprocess = False
+
+    def test_registers_in_order(self):
+        assert list(process_cloudnet.CONVERTERS['disdrometer']) == ['parsivel', 'thies-lnm']
+        assert list(process_cloudnet.CONVERTERS['lidar']) == ['chm15k', 'cl51']
+
+    def test_selects_first_instrument_with_raw_data(self):
+        uploads = [{'uuid': 'a', 'status': 'uploaded'}]
+        self.process._md_index = FakeIndex({'thies-lnm': uploads})
+        assert self.process._select_instrument('disdrometer') == ('thies-lnm', uploads)
+        self.process._md_index = FakeIndex({'thies-lnm': uploads, 'parsivel': uploads})
+        assert self.process._select_instrument('disdrometer') == ('parsivel', uploads)
+
+    def test_raises_without_raw_data(self):
+        self.process._md_index = FakeIndex({})
+        with pytest.raises(RawDataMissingError):
+            self.process._select_instrument('disdrometer')
+
+    def test_rejects_duplicate(self):
+        function = process_cloudnet.CONVERTERS['disdrometer']['parsivel']
+        with pytest.raises(ValueError):
+            process_cloudnet.converter('disdrometer', 'parsivel')(lambda: None)
+        assert process_cloudnet.CONVERTERS['disdrometer']['parsivel'] is function
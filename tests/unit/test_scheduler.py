@@ -0,0 +1,90 @@
+import sys
+import time
+import pytest
+from data_processing.scheduler import Scheduler, DONE, FAILED, SKIPPED
+from data_processing.utils import MiscError
+
+
+def _fail():
+    raise MiscError('failure')
+
+
+class TestScheduler:
+
+    def test_runs_tasks_after_dependencies(self):
+        order = []
+        scheduler = Scheduler()
+        scheduler.add('categorize', lambda: order.append('categorize'), ['radar', 'lidar'])
+        scheduler.add('radar', lambda: order.append('radar'))
+        scheduler.add('lidar', lambda: order.append('lidar'))
+        scheduler.add('classification', lambda: order.append('classification'), ['categorize'])
+        status = scheduler.run()
+        assert set(status.values()) == {DONE}
+        assert set(order[:2]) == {'radar', 'lidar'}
+        assert order[2:] == ['categorize', 'classification']
+
+    def test_runs_independent_tasks_concurrently(self):
+        scheduler = Scheduler()
+        for product in ('radar', 'lidar', 'mwr', 'model'):
+            scheduler.add(product, lambda: time.sleep(0.2))
+        start = time.time()
+        scheduler.run()
+        assert time.time() - start < 0.6
+
+    def test_skips_dependants_of_failed_task(self):
+        scheduler = Scheduler()
+        scheduler.add('radar', _fail)
+        scheduler.add('lidar', lambda: None)
+        scheduler.add('categorize', lambda: None, ['radar', 'lidar'])
+        scheduler.add('iwc', lambda: None, ['categorize'])
+        status = scheduler.run(on_skip=lambda name, failed: f'{name} skipped ({failed})')
+        assert status == {'radar': FAILED, 'lidar': DONE, 'categorize': SKIPPED,
+                          'iwc': SKIPPED}
+
+    def test_runtime_error_fails_task(self):
+        def _processing_error():
+            raise RuntimeError('processing failed')
+        scheduler = Scheduler()
+        scheduler.add('radar', _processing_error)
+        scheduler.add('lidar', lambda: None)
+        scheduler.add('categorize', lambda: None, ['radar', 'lidar'])
+        assert scheduler.run() == {'radar': FAILED, 'lidar': DONE, 'categorize': SKIPPED}
+
+    def test_raises_unexpected_error(self):
+        stdout = sys.stdout
+        scheduler = Scheduler()
+        scheduler.add('radar', lambda: {}['foo'])
+        scheduler.add('lidar', lambda: time.sleep(0.1))
+        with pytest.raises(KeyError):
+            scheduler.run()
+        assert sys.stdout is stdout
+
+    def test_task_returning_false_fails(self):
+        scheduler = Scheduler()
+        scheduler.add('model', lambda: False)
+        scheduler.add('categorize', lambda: None, ['model'])
+        assert scheduler.run() == {'model': FAILED, 'categorize': SKIPPED}
+
+    def test_ignores_dependencies_not_scheduled(self):
+        scheduler = Scheduler()
+        scheduler.add('classification', lambda: None, ['categorize'])
+        assert scheduler.run() == {'classification': DONE}
+
+    def test_groups_output_per_task(self, capsys):
+        def _task(name):
+            print(name, end='\t')
+            time.sleep(0.1)
+            print('done')
+        scheduler = Scheduler()
+        scheduler.add('radar', lambda: _task('radar'))
+        scheduler.add('lidar', lambda: _task('lidar'))
+        scheduler.run()
+        lines = capsys.readouterr().out.splitlines()
+        assert sorted(lines) == ['lidar\tdone', 'radar\tdone']
+
+    def test_raises_on_circular_dependency(self):
+        scheduler = Scheduler()
+        scheduler.add('a', lambda: None, ['b'])
+        scheduler.add('b', lambda: None, ['a'])
+        with pytest.raises(ValueError):
+            scheduler.run()
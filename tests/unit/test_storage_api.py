@@ -1,6 +1,9 @@
-from data_processing.storage_api import StorageApi
+from data_processing.storage_api import StorageApi, Transfer, TransferManager
+from data_processing.utils import ChecksumError
 from tempfile import TemporaryDirectory
 import os
+import pytest
+import requests
 from test_utils import utils as utils
 
 session, adapter, mock_addr = utils.init_test_session()
@@ -51,6 +54,82 @@ class TestStorageApi:
         assert full_paths[0] == f'{self.temp_dir.name}/{filename}'
         file.close()
 
+    def test_download_raw_files_with_checksum(self):
+        filename = '00100_A202010220835_CHM170137.nc'
+        s3key = 'ur_a_nus_2'
+        metadata = [
+            {
+                's3key': s3key,
+                'filename': filename,
+                'checksum': '980201db3fe930942b9138428464b449'
+            },
+        ]
+        file = open(f'tests/data/raw/chm15k/{filename}', 'rb')
+        adapter.register_uri('GET', f'{mock_addr}cloudnet-upload/{s3key}', body=file)
+        storage_api = StorageApi(config, session)
+        full_paths = storage_api.download_raw_files(metadata, self.temp_dir.name)
+        expected_size = os.path.getsize(f'tests/data/raw/chm15k/{filename}')
+        assert os.path.getsize(full_paths[0]) == expected_size
+        file.close()
+
+    def test_download_product_with_wrong_checksum(self):
+        filename = '20201022_bucharest_ecmwf.nc'
+        metadata = {
+            'volatile': True,
+            'filename': filename,
+            'checksum': 'ce141a626d64555095436921ec130800b47125ec4dc87768e5e94a0856ee6a99'
+        }
+        file = open(f'tests/data/products/{filename}', 'rb')
+        adapter.register_uri('GET', f'{mock_addr}cloudnet-product-volatile/{filename}', body=file)
+        storage_api = StorageApi(config, session)
+        with pytest.raises(ChecksumError):
+            storage_api.download_product(metadata, self.temp_dir.name)
+        assert not os.path.isfile(f'{self.temp_dir.name}/{filename}')
+        file.close()
+
+    def test_download_products(self):
+        filenames = ['20201022_bucharest_ecmwf.nc', '20201121_bucharest_classification.nc']
+        metadata = [{'volatile': False, 'filename': filename} for filename in filenames]
+        files = [open(f'tests/data/products/{filename}', 'rb') for filename in filenames]
+        for filename, file in zip(filenames, files):
+            adapter.register_uri('GET', f'{mock_addr}cloudnet-product/{filename}', body=file)
+        storage_api = StorageApi(config, session)
+        full_paths = storage_api.download_products(metadata, self.temp_dir.name)
+        assert full_paths == [f'{self.temp_dir.name}/{filename}' for filename in filenames]
+        for filename, full_path in zip(filenames, full_paths):
+            assert os.path.getsize(full_path) == os.path.getsize(f'tests/data/products/{filename}')
+        for file in files:
+            file.close()
+
+    def test_download_raw_files_with_error(self):
+        metadata = [{'s3key': 'ur_ok', 'filename': 'ok.nc'},
+                    {'s3key': 'ur_missing', 'filename': 'missing.nc'}]
+        adapter.register_uri('GET', f'{mock_addr}cloudnet-upload/ur_ok', content=b'abc')
+        adapter.register_uri('GET', f'{mock_addr}cloudnet-upload/ur_missing', status_code=404)
+        storage_api = StorageApi(config, session)
+        with pytest.raises(requests.HTTPError):
+            storage_api.download_raw_files(metadata, self.temp_dir.name)
+        assert os.path.isfile(f'{self.temp_dir.name}/ok.nc')
+
+    def test_download_raw_files_from_cache(self):
+        filename = '00100_A202010220835_CHM170137.nc'
+        s3key = 'ur_cached'
+        metadata = [{'s3key': s3key, 'filename': filename,
+                     'checksum': '980201db3fe930942b9138428464b449'}]
+        file = open(f'tests/data/raw/chm15k/{filename}', 'rb')
+        adapter.register_uri('GET', f'{mock_addr}cloudnet-upload/{s3key}', body=file)
+        cache_dir = TemporaryDirectory()
+        cache_config = {**config, 'FILE-CACHE': {'cache_dir': cache_dir.name}}
+        storage_api = StorageApi(cache_config, session)
+        n_requests = adapter.call_count
+        for _ in range(2):
+            with TemporaryDirectory() as dir_name:
+                full_paths = storage_api.download_raw_files(metadata, dir_name)
+                assert os.path.isfile(full_paths[0])
+        assert adapter.call_count == n_requests + 1
+        assert storage_api.file_cache.hits == 1
+        file.close()
+
     def test_upload_stable_product(self):
         s3key = '20201022_bucharest_ecmwf.nc'
         full_path = f'tests/data/products/{s3key}'
@@ -76,3 +155,40 @@ class TestStorageApi:
         storage_api = StorageApi(config, session)
         data = storage_api.upload_product(full_path, s3key)
         assert data == res
+
+    def test_close_stops_plot_pool(self):
+        storage_api = StorageApi(config, session)
+        pool = storage_api._get_plot_pool()
+        assert pool.apply(os.getpid) != os.getpid()
+        storage_api.close()
+        assert storage_api._plot_pool is None
+        with pytest.raises(ValueError):
+            pool.apply(os.getpid)
+
+
+class TestTransferManager:
+
+    temp_dir = TemporaryDirectory()
+
+    def test_collects_progress_and_errors(self):
+        adapter.register_uri('GET', f'{mock_addr}transfer/a', content=b'12345')
+        adapter.register_uri('GET', f'{mock_addr}transfer/b', status_code=500)
+        transfers = [Transfer('GET', f'{mock_addr}transfer/{name}', f'{self.temp_dir.name}/{name}')
+                     for name in ('a', 'b')]
+        manager = TransferManager(session, ('test', 'test'), max_workers=2)
+        with pytest.raises(requests.HTTPError):
+            manager.run(transfers)
+        assert transfers[0].error is None
+        assert transfers[0].bytes_transferred == 5
+        assert isinstance(transfers[1].error, requests.HTTPError)
+        assert transfers[1].bytes_transferred == 0
+
+    def test_put(self):
+        full_path = f'{self.temp_dir.name}/put.txt'
+        with open(full_path, 'w') as f:
+            f.write('abc')
+        adapter.register_uri('PUT', f'{mock_addr}transfer/put', json={'size': 3})
+        transfer = Transfer('PUT', f'{mock_addr}transfer/put', full_path)
+        TransferManager(session, ('test', 'test')).run([transfer])
+        assert transfer.response.json() == {'size': 3}
+        assert transfer.bytes_transferred == 3
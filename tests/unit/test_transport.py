@@ -0,0 +1,81 @@
+import pickle
+import pytest
+import requests
+from data_processing import transport
+
+config = {
+    'HTTP': {
+        'pool_size': '4',
+        'connect_timeout': '2',
+        'read_timeout': '30',
+        'retries': '5',
+    },
+}
+
+
+def _get_adapter(session):
+    return session.get_adapter('http://test/')
+
+
+def test_configures_adapter():
+    adapter = _get_adapter(transport.create_session(config))
+    assert isinstance(adapter, transport.TimeoutHTTPAdapter)
+    assert adapter.timeout == (2, 30)
+    assert adapter.max_retries.total == 5
+    assert adapter._pool_maxsize == 4
+
+
+def test_uses_defaults_without_config():
+    adapter = _get_adapter(transport.create_session({}))
+    assert adapter.timeout == (transport.CONNECT_TIMEOUT, transport.READ_TIMEOUT)
+    assert adapter.max_retries.total == transport.RETRIES
+
+
+def test_does_not_retry_requests_with_body():
+    retry = _get_adapter(transport.create_session({})).max_retries
+    assert retry.is_retry('GET', 503)
+    assert not retry.is_retry('PUT', 503)
+    assert not retry.is_retry('POST', 503)
+
+
+def test_session_is_picklable():
+    session = pickle.loads(pickle.dumps(transport.create_session(config)))
+    assert _get_adapter(session).timeout == (2, 30)
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = transport.CircuitBreaker('http://test', max_failures=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert not breaker.is_open
+        breaker.record_failure()
+        assert breaker.is_open
+        with pytest.raises(transport.CircuitOpenError):
+            breaker.before_request()
+        assert breaker.refused == 1
+
+    def test_probes_after_reset_timeout(self):
+        breaker = transport.CircuitBreaker('http://test', max_failures=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.before_request()
+        with pytest.raises(transport.CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        assert breaker.is_open
+        breaker.before_request()
+        breaker.record_success()
+        assert not breaker.is_open
+
+    def test_session_refuses_requests_to_failing_service(self):
+        session = transport.create_session({'HTTP': {'max_failures': '2', 'retries': '0',
+                                                     'connect_timeout': '0.5'}})
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                session.get('http://localhost:1/')
+        with pytest.raises(transport.CircuitOpenError):
+            session.get('http://localhost:1/')
+        assert [breaker.service for breaker in transport.get_open_circuits(session)] == \
+            ['http://localhost:1']
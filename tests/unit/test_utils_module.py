@@ -29,13 +29,6 @@ def test_create_product_payload(key, value):
     assert payload[key] == value
 
 
-def test_read_site_info():
-    site = 'bucharest'
-    site_info = utils.read_site_info(site)
-    assert site_info['id'] == site
-    assert site_info['name'] == 'Bucharest'
-
-
 def test_date_string_to_date():
     date = '2020-01-01'
     res = utils.date_string_to_date(date)
@@ -77,14 +70,6 @@ def test_get_product_bucket():
     assert utils.get_product_bucket(False) == 'cloudnet-product'
 
 
-def test_get_product_types():
-    l1_types = ['lidar', 'model', 'mwr', 'radar']
-    l2_types = ['classification', 'drizzle', 'iwc', 'lwc']
-    assert utils.get_product_types(level=1) == l1_types
-    assert utils.get_product_types(level=2) == l2_types
-    assert utils.get_product_types() == l1_types + ['categorize'] + l2_types
-
-
 class TestHash:
 
     file = 'tests/data/products/20201121_bucharest_classification.nc'
@@ -97,6 +82,19 @@ class TestHash:
         hash_sum = utils.sha256sum(self.file)
         assert hash_sum == '48e006f769a9352a42bf41beac449eae62aea545f4d3ba46bffd35759d8982ca'
 
+    def test_md5sum_base64(self):
+        hash_sum = utils.md5sum(self.file, is_base64=True)
+        assert hash_sum == 'yB14NNcYn6y8X2NBb+Wz2g=='
+
+    def test_get_digests_is_cached(self, tmpdir):
+        file = tmpdir.join('file.txt')
+        file.write('abc')
+        digests = utils.get_digests(str(file))
+        assert digests['md5'].hex() == '900150983cd24fb0d6963f7d28e17f72'
+        assert utils.get_digests(str(file)) is digests
+        file.write('abcd')
+        assert utils.get_digests(str(file))['md5'].hex() == 'e2fc714c4727ee9395f324cd2e7f331f'
+
 
 class TestsCreateProductPutPayload:
 
@@ -127,6 +125,28 @@ class TestsCreateProductPutPayload:
         assert len(payload['cloudnetpyVersion']) == 5
 
 
+class TestProductFacts:
+
+    def test_facts(self):
+        file = 'tests/data/products/20201121_bucharest_classification.nc'
+        facts = utils.ProductFacts(file)
+        assert facts.product == 'classification'
+        assert facts.site == 'bucharest'
+        assert facts.date_str == '2020-11-21'
+        assert facts.volatile is True
+        assert facts.pid == ''
+        assert facts.checksum == utils.sha256sum(file)
+        assert facts.content_md5 == utils.md5sum(file, is_base64=True)
+
+    def test_payload_from_facts(self):
+        file = 'tests/data/products/20201121_bucharest_classification.nc'
+        facts = utils.ProductFacts(file)
+        payload = utils.create_product_put_payload(file, {'size': 66}, facts=facts)
+        assert payload['uuid'] == facts.uuid
+        assert payload['checksum'] == facts.checksum
+        assert payload['measurementDate'] == '2020-11-21'
+
+
 @pytest.mark.parametrize("filename, identifier", [
     ('20201022_bucharest_gdas1.nc', 'gdas1'),
     ('20201022_bucharest_ecmwf.nc', 'ecmwf'),
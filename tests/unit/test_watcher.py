@@ -0,0 +1,92 @@
+import re
+import pytest
+from data_processing import watcher
+from data_processing.metadata_api import MetadataApi
+from test_utils import utils
+
+session, adapter, mock_addr = utils.init_test_session()
+
+
+def _upload(uuid: str, updated_at: str, instrument: str = 'chm15k', date_str: str = '2020-10-22',
+            status: str = 'uploaded') -> dict:
+    return {'uuid': uuid,
+            'updatedAt': updated_at,
+            'status': status,
+            'measurementDate': date_str,
+            'site': {'id': 'bucharest'},
+            'instrument': {'id': instrument, 'type': 'lidar'},
+            'model': None}
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDebouncer:
+
+    @pytest.fixture(autouse=True)
+    def _init(self):
+        self.clock = Clock()
+        self.debouncer = watcher.Debouncer(100, clock=self.clock)
+
+    def test_waits_until_settled(self):
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 60
+        self.debouncer.update([_upload('a', '1'), _upload('b', '2')])
+        self.clock.now = 150
+        assert self.debouncer.pop_settled() == []
+        self.clock.now = 160
+        settled = self.debouncer.pop_settled()
+        assert len(settled) == 1
+        key, rows = settled[0]
+        assert key == ('bucharest', '2020-10-22', 'chm15k')
+        assert sorted(row['uuid'] for row in rows) == ['a', 'b']
+        assert self.debouncer.pop_settled() == []
+
+    def test_groups_by_instrument_and_date(self):
+        self.debouncer.update([_upload('a', '1'),
+                               _upload('b', '1', instrument='mira'),
+                               _upload('c', '1', date_str='2020-10-23')])
+        self.clock.now = 100
+        keys = [key for key, _ in self.debouncer.pop_settled()]
+        assert keys == [('bucharest', '2020-10-22', 'chm15k'),
+                        ('bucharest', '2020-10-22', 'mira'),
+                        ('bucharest', '2020-10-23', 'chm15k')]
+
+    def test_processed_uploads_are_not_returned_again(self):
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 100
+        assert len(self.debouncer.pop_settled()) == 1
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 200
+        assert self.debouncer.pop_settled() == []
+
+    def test_updated_upload_is_returned_again(self):
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 100
+        self.debouncer.pop_settled()
+        self.debouncer.update([_upload('a', '2')])
+        self.clock.now = 200
+        assert len(self.debouncer.pop_settled()) == 1
+
+    def test_forget(self):
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 100
+        _, rows = self.debouncer.pop_settled()[0]
+        self.debouncer.forget(rows)
+        self.debouncer.update([_upload('a', '1')])
+        self.clock.now = 200
+        assert len(self.debouncer.pop_settled()) == 1
+
+
+def test_fetch_unprocessed_uploads():
+    rows = [_upload('a', '1'), _upload('b', '1', status='processed')]
+    adapter.register_uri('GET', re.compile(f'{mock_addr}upload-metadata(.*?)'), json=rows)
+    md_api = MetadataApi({'METADATASERVER': {'url': mock_addr}}, session)
+    assert watcher.fetch_unprocessed_uploads(md_api, 'bucharest') == rows[:1]
+    assert adapter.last_request.qs['status'] == ['uploaded']
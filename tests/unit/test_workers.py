@@ -0,0 +1,41 @@
+import os
+import math
+import pickle
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from data_processing.workers import WorkerPool
+
+
+class TestWorkerPool:
+
+    @pytest.fixture(autouse=True)
+    def _init(self):
+        self.pool = WorkerPool(max_workers=1)
+        yield
+        self.pool.close()
+
+    def test_run(self):
+        assert self.pool.run(math.sqrt, 4) == 2
+        assert self.pool.run(os.getpid) != os.getpid()
+
+    def test_error_is_raised(self):
+        with pytest.raises(ValueError):
+            self.pool.run(math.sqrt, -1)
+
+    def test_processes_are_replaced(self):
+        self.pool.max_tasks = 2
+        pids = [self.pool.run(os.getpid) for _ in range(4)]
+        assert pids[0] == pids[1]
+        assert pids[1] != pids[2]
+        assert pids[2] == pids[3]
+
+    def test_new_pool_after_worker_dies(self):
+        with pytest.raises(BrokenProcessPool):
+            self.pool.run(os._exit, 1)
+        assert self.pool.run(math.sqrt, 4) == 2
+
+    def test_pickled_pool(self):
+        self.pool.run(os.getpid)
+        pool = pickle.loads(pickle.dumps(self.pool))
+        assert pool.run(math.sqrt, 4) == 2
+        pool.close()